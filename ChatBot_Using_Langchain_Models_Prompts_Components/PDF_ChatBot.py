@@ -1,43 +1,57 @@
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langchain_core.messages import SystemMessage
 from dotenv import load_dotenv
-import fitz  # PyMuPDF
+import os
+import sys
+
+# The PDF extraction engine lives next to the EvaluMate apps
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "EvaluMate"))
+from document import Document
+from pdf_extraction import extract_pages
+from chunking import book_budget, leading_text
+from conversation_memory import ConversationMemory
+from models import chat_model
 
 def extract_pdf_text(pdf_path):
-    doc = fitz.open(pdf_path)
-    text = ""
-    for page in doc:
-        text += page.get_text()
-    return text
+    # One join into a page-indexed buffer; `document.page(n)` gives page n without a second copy
+    return Document.from_pages(extract_pages(pdf_path))
 
-load_dotenv()
+# Worker processes re-import this script, so the chat only runs when it is executed directly
+if __name__ == "__main__":
+    load_dotenv()
 
-# Load your PDF
-pdf_path = r"C:\Users\OMOLP094\Desktop\My_GitHub_Repos\Generative-AI-with-LangChain\ChatBot_Using_Langchain_Models_Prompts_Components\machine_learning_tutorial.pdf"  # <-- Replace with your actual PDF path
-pdf_text = extract_pdf_text(pdf_path)
+    # Load your PDF
+    pdf_path = r"C:\Users\OMOLP094\Desktop\My_GitHub_Repos\Generative-AI-with-LangChain\ChatBot_Using_Langchain_Models_Prompts_Components\machine_learning_tutorial.pdf"  # <-- Replace with your actual PDF path
+    document = extract_pdf_text(pdf_path)
 
-# Truncate if too large for context (especially important for hosted models)
-pdf_text = pdf_text[:5000]  # You can increase this based on model token limit
+    # The start of the book, up to EVALUMATE_BOOK_TOKENS (it is resent every turn), cut at a page/paragraph/sentence boundary
+    model_name = "o4-mini"
+    pdf_text = leading_text(document, book_budget(model_name, reserve=4096), model_name)
 
-# Create the model endpoint
-model = ChatOpenAI(model = "o4-mini", temperature=0, max_tokens=100)
+    # Create the model endpoint
+    model = chat_model(ChatOpenAI, model = model_name, temperature=0, max_tokens=100)
 
-# System message with PDF content embedded
-chat_history = [
-    SystemMessage(content=f"""You are an expert examiner conducting a viva based on the contents of the following PDF content:
+    # System message with PDF content embedded
+    system_message = SystemMessage(content=f"""You are an expert examiner conducting a viva based on the contents of the following PDF content:
 
 --- START OF PDF CONTENT ---
 {pdf_text}
 --- END OF PDF CONTENT ---
 
 Ask me questions directly based on this content. After I respond, evaluate my answer strictly with reference to the PDF. Explain if wrong. Do not reveal answers unless I try. Be professional, like a real viva.""")
-]
-
-while True:
-    user_input = input('You: ')
-    chat_history.append(HumanMessage(content=user_input))
-    if user_input.lower() == 'exit':
-        break
-    result = model.invoke(chat_history)
-    chat_history.append(AIMessage(content=result.content))
-    print("AI:", result.content)
+
+    # Summaries get their own model: the chat model's 100-token cap (reasoning included) would cut them short
+    # and lose the folded turns for good
+    summarizer = chat_model(ChatOpenAI, model="gpt-4o-mini", temperature=0)
+
+    # Only the last few turns go out verbatim; older ones are folded into a running summary
+    memory = ConversationMemory(system_message, summarizer, history_tokens=2000, model_name=model_name)
+
+    while True:
+        user_input = input('You: ')
+        if user_input.lower() == 'exit':
+            break
+        memory.add_user(user_input)
+        result = model.invoke(memory.messages())
+        print("AI:", result.content)
+        memory.add_ai(result.content)
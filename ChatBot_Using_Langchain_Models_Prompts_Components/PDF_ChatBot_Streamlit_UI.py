@@ -1,16 +1,21 @@
 import streamlit as st
 from langchain_community.chat_models import ChatOllama
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
-import fitz  # PyMuPDF
 import tempfile
+import os
+import sys
 
-# Extract text from PDF
+# The PDF extraction engine lives next to the EvaluMate apps
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "EvaluMate"))
+from pdf_cache import pdf_text_cache
+from chunking import book_budget, leading_text
+from streaming import StreamTiming, timed_stream
+from models import chat_model
+
+# Extract text from PDF (parsed once per book per process, not on every rerun)
 def extract_pdf_text(pdf_file):
-    doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
-    text = ""
-    for page in doc:
-        text += page.get_text()
-    return text
+    _, document = pdf_text_cache.get_or_extract(pdf_file.getvalue())
+    return document
 
 # Streamlit UI setup
 st.set_page_config(page_title="PDF Viva Chatbot (Ollama)", layout="wide")
@@ -20,11 +25,14 @@ uploaded_file = st.file_uploader("Upload a PDF file", type="pdf")
 
 if uploaded_file:
     with st.spinner("Extracting PDF content..."):
-        pdf_text = extract_pdf_text(uploaded_file)
-        pdf_text = pdf_text[:5000]  # Truncate to fit model context
+        document = extract_pdf_text(uploaded_file)
 
     # Initialize Ollama model (e.g., llama3, mistral, codellama)
-    model = ChatOllama(model="qwen2.5:0.5b")  # Change to your model if needed
+    model_name = "qwen2.5:0.5b"  # Change to your model if needed
+    model = chat_model(ChatOllama, model=model_name)
+
+    # The start of the book, up to EVALUMATE_BOOK_TOKENS and never more than the context leaves room for
+    pdf_text = leading_text(document, book_budget(model_name, reserve=1024), model_name)
 
     # Initialize session state
     if "chat_history" not in st.session_state:
@@ -40,17 +48,22 @@ Ask me questions directly based on this content. After I respond, evaluate my an
 
     st.subheader("🗣️ Viva Chat Interface")
 
-    user_input = st.chat_input("Type your response or question...")
-
-    if user_input:
-        st.session_state.chat_history.append(HumanMessage(content=user_input))
-        with st.spinner("AI is thinking..."):
-            response = model.invoke(st.session_state.chat_history)
-            st.session_state.chat_history.append(AIMessage(content=response.content))
-
     # Render chat messages
     for msg in st.session_state.chat_history:
         if isinstance(msg, HumanMessage):
             st.chat_message("user").markdown(msg.content)
         elif isinstance(msg, AIMessage):
             st.chat_message("assistant").markdown(msg.content)
+
+    user_input = st.chat_input("Type your response or question...")
+
+    if user_input:
+        st.session_state.chat_history.append(HumanMessage(content=user_input))
+        st.chat_message("user").markdown(user_input)
+
+        # Show the reply as it is generated; it joins the history once the stream is complete
+        timing = StreamTiming()
+        with st.chat_message("assistant"):
+            reply = st.write_stream(timed_stream(model.stream(st.session_state.chat_history), timing))
+        st.session_state.chat_history.append(AIMessage(content=reply))
+        st.caption(timing.summary())
@@ -1,6 +1,11 @@
 from langchain_huggingface import ChatHuggingFace, HuggingFaceEndpoint
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langchain_core.messages import SystemMessage
 from dotenv import load_dotenv
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "EvaluMate"))
+from conversation_memory import ConversationMemory
 
 load_dotenv()
 
@@ -11,17 +16,20 @@ llm = HuggingFaceEndpoint(
 
 model = ChatHuggingFace(llm=llm)
 
-chat_history = [
-    SystemMessage(content='You are an expert examiner conducting a viva based on the contents of a specific PDF document that I will provide. Your role is to ask me questions directly based on the material in that PDF. After I respond to each question, evaluate the accuracy, completeness, and correctness of my answer strictly with reference to the PDF content. If the answer is incorrect, explain why and provide the correct response. Ask follow-up questions if necessary. Do not reveal answers unless I have attempted them or asked for clarification. Maintain a professional, academic tone as in an actual viva examination.')
-]
+memory = ConversationMemory(
+    SystemMessage(content='You are an expert examiner conducting a viva based on the contents of a specific PDF document that I will provide. Your role is to ask me questions directly based on the material in that PDF. After I respond to each question, evaluate the accuracy, completeness, and correctness of my answer strictly with reference to the PDF content. If the answer is incorrect, explain why and provide the correct response. Ask follow-up questions if necessary. Do not reveal answers unless I have attempted them or asked for clarification. Maintain a professional, academic tone as in an actual viva examination.'),
+    model,
+    history_tokens=2000,
+)
 
 while True:
     user_input = input('You: ')
-    chat_history.append(HumanMessage(content=user_input))
     if user_input == 'exit':
         break
-    result = model.invoke(chat_history)
-    chat_history.append(AIMessage(content=result.content))
+    memory.add_user(user_input)
+    result = model.invoke(memory.messages())
     print("AI: ",result.content)
+    memory.add_ai(result.content)
 
-print(chat_history)
\ No newline at end of file
+memory.wait()
+print(memory.messages())
\ No newline at end of file
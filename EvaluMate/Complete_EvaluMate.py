@@ -2,65 +2,125 @@
 Streamlit Viva Application
 
 Project Description:
-This project implements a Streamlit-based application that conducts a viva (oral exam) for students on any book provided as a PDF. The student enters their name, grade, subject, and uploads the PDF of the book. Upon clicking "Start Viva", the application extracts all text from the PDF, feeds it to a LangChain-based ChatOpenAI model for question generation and evaluation, and dynamically generates questions. Each question is presented in text and audio (via TTS). The student records their spoken answer, which is converted to text using speech recognition. The model evaluates the answer for correctness, adapts difficulty based on performance and detected learning disorders, and provides feedback. All interactions—questions asked, correctness, timings, scores, and detected learning disorders—are logged to a CSV file. At the end of the viva, the student's performance stats (excluding learning disorder) are displayed and saved.
+This project implements a Streamlit-based application that conducts a viva (oral exam) for students on any book provided as a PDF. The student enters their name, grade, subject, and uploads the PDF of the book. Upon clicking "Start Viva", the application extracts all text from the PDF and feeds the relevant passages (or the whole book, if it is small) to a LangChain-based ChatOpenAI model for question generation and evaluation, and dynamically generates questions. Each question is presented in text and audio (via TTS). The student records their spoken answer, which is converted to text using speech recognition. The model evaluates the answer for correctness, adapts difficulty based on performance and detected learning disorders, and provides feedback. All interactions—questions asked, correctness, timings, scores, and detected learning disorders—are logged to a CSV file. At the end of the viva, the student's performance stats (excluding learning disorder) are displayed and saved.
 ''' 
 import streamlit as st
-import fitz  
 from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
-from gtts import gTTS
-import tempfile
 import time
 import pandas as pd
-import speech_recognition as sr
 import os
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from pdf_cache import pdf_text_cache
+from retrieval import relevant_context, window_context
+from tts_cache import join_speech, split_sentences, tts_cache
+from audio_player import play_segments
+from models import chat_model
+from audio_capture import Recording
+from stt_backends import get_recognizer
+from tracing import begin_rerun, debug_enabled, debug_panel, end_rerun, session_id, span
 
 # ------------------ Configuration ------------------
 load_dotenv()  # load OPENAI_API_KEY from .env
-model = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+MODEL_NAME = "gpt-4o-mini"
+model = chat_model(ChatOpenAI, model=MODEL_NAME, temperature=0)
+DIFFICULTIES = ('easy', 'medium', 'hard')
+# Seconds to wait for a prefetched question before asking for a fresh one
+PREFETCH_TIMEOUT = float(os.getenv("EVALUMATE_PREFETCH_TIMEOUT", "20"))
 
 # ------------------ Helper Functions ------------------
 
-def extract_pdf_text(pdf_file):
+def load_document(pdf_file):
     """
-    Extract all text from the uploaded PDF using PyMuPDF.
+    Extract the uploaded PDF as a page-indexed Document using PyMuPDF (each book is parsed once per process).
     `pdf_file` is the Streamlit UploadedFile, which has a .read() method.
     """
-    pdf_bytes = pdf_file.read()
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    return "\n".join(page.get_text() for page in doc)
+    _, document = pdf_text_cache.get_or_extract(pdf_file.read())
+    return document
 
 
-def generate_question(context, difficulty):
-    """Generate a question via LangChain ChatOpenAI based on context and difficulty."""
+def generate_question(document, difficulty, asked=()):
+    """Generate a question via LangChain ChatOpenAI based on a stretch of the book and difficulty."""
+    # Large books: a different part of the book for each question instead of all of it
+    context = window_context(document, model_name=MODEL_NAME, seed=f"{document.doc_id}:{len(asked)}")
     prompt = (
         f"You are an examiner. Given the following content, generate one question at difficulty level '{difficulty}':\n{context}"
     )
+    if asked:
+        prompt += "\n\nDo not repeat any of these questions:\n" + "\n".join(f"- {q}" for q in asked)
     result = model.invoke(prompt)
     return result.content.strip()
 
 
+@st.cache_resource
+def question_executor():
+    # Shared by all sessions; prefetches are short LLM calls
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="question")
+
+
+def _prefetch_question(document, difficulty, asked):
+    with span("questions.prefetch", difficulty=difficulty):
+        q = generate_question(document, difficulty, asked)
+    # Synthesize its audio too, so the question is read out the moment it is shown
+    tts_cache.prefetch(split_sentences(q))
+    return q
+
+
+def prefetch_questions(document, asked):
+    """Start generating the next question for every difficulty; returns {difficulty: Future}."""
+    asked = tuple(asked)
+    return {
+        difficulty: question_executor().submit(
+            contextvars.copy_context().run, _prefetch_question, document, difficulty, asked
+        )
+        for difficulty in DIFFICULTIES
+    }
+
+
+def next_question(document, difficulty, asked):
+    """The prefetched question for `difficulty` if there is one (waiting up to PREFETCH_TIMEOUT), else a new one."""
+    prefetched = st.session_state.pop('prefetched', {})
+    future = prefetched.pop(difficulty, None)
+    for other in prefetched.values():
+        other.cancel()
+    if future is not None:
+        try:
+            return future.result(timeout=PREFETCH_TIMEOUT)
+        except Exception:
+            # Failed or hung; a hung call keeps its pool thread, but the script moves on
+            future.cancel()
+    return generate_question(document, difficulty, asked)
+
+
 def text_to_speech(text):
-    """Convert text to speech and return path to audio file."""
-    tts = gTTS(text=text)
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-    tts.save(tmp.name)
-    return tmp.name
-
-
-def recognize_speech(audio_path):
-    """Convert recorded WAV audio file to text using SpeechRecognition."""
-    r = sr.Recognizer()
-    with sr.AudioFile(audio_path) as source:
-        audio = r.record(source)
-    try:
-        return r.recognize_google(audio)
-    except sr.UnknownValueError:
-        return ""
+    """Convert text to speech; returns cached Speech(data, format) bytes, no file on disk."""
+    return join_speech(tts_cache.stream(text))
+
+
+def speak(text):
+    """Play `text` in the browser sentence by sentence as it is synthesized; returns the whole Speech."""
+    return join_speech(play_segments(tts_cache.stream(text)))
 
 
-def evaluate_answer(context, question, answer):
+def recognize_speech(recording):
+    """Convert a recorded answer (an in-memory Recording) to text with the configured STT backend."""
+    recognizer = speech_recognizer()
+    with span("stt.transcribe", backend=recognizer.name, audio_seconds=round(recording.seconds, 2)):
+        return recognizer.transcribe(recording)
+
+
+@st.cache_resource
+def speech_recognizer():
+    # EVALUMATE_STT picks the backend (google or a local vosk model, loaded once per process)
+    return get_recognizer()
+
+
+def evaluate_answer(document, question, answer):
     """Evaluate student's answer via LangChain ChatOpenAI and adjust difficulty/disorders."""
+    # Only the passages relevant to this question and answer, unless the whole book is small
+    context = relevant_context(document, f"{question}\n{answer}", model_name=MODEL_NAME)
     prompt = (
         f"Context: {context}\nQuestion: {question}\nStudent's Answer: {answer}\n"
         "Assess if the answer is correct. Provide feedback. "
@@ -71,7 +131,7 @@ def evaluate_answer(context, question, answer):
     lines = result.content.strip().split("\n")
     is_correct = 'correct' in lines[0].lower()
     feedback = lines[1] if len(lines) > 1 else ''
-    new_difficulty = lines[2].split()[-1].lower() if len(lines) > 2 else 'medium'
+    new_difficulty = lines[2].split()[-1].strip(".*'\"").lower() if len(lines) > 2 else 'medium'
     potential_disorder = None if len(lines) < 4 or lines[3].lower() == 'none' else lines[3]
     return is_correct, feedback, new_difficulty, potential_disorder
 
@@ -105,78 +165,132 @@ def main():
 
     if st.button("Start Viva") and pdf_file and name and grade and subject and book:
         st.session_state.started = True
-        st.session_state.context = extract_pdf_text(pdf_file)
+        st.session_state.document = load_document(pdf_file)
         st.session_state.start_time = time.time()
+        st.session_state.phase = 'asking'
+        st.session_state.question = None
+        st.session_state.asked = []
+        st.session_state.prefetched = {}
         st.success("Viva Started!")
 
-    if st.session_state.started:
-        # Generate question
-        q = generate_question(st.session_state.context, st.session_state.difficulty)
-        st.markdown(f"**Question:** {q}")
-        audio_path = text_to_speech(q)
-        st.audio(audio_path)
+    if not st.session_state.started:
+        return
+
+    # --- Viva state machine: asking -> answering -> grading -> next -> asking ... ---
+    if st.session_state.phase == 'asking':
+        q = next_question(st.session_state.document, st.session_state.difficulty, st.session_state.asked)
+        st.session_state.question = q
+        st.session_state.asked.append(q)
+        st.session_state.phase = 'answering'
+        # Candidates for every difficulty the grader may pick, ready by the time this answer is graded
+        st.session_state.prefetched = prefetch_questions(st.session_state.document, st.session_state.asked)
+
+    q = st.session_state.question
+    st.markdown(f"**Question:** {q}")
+    if st.session_state.get('spoken_question') != q:
+        # New question: start reading it out as soon as its first sentence is ready
+        speech = speak(q)
+        st.session_state.spoken_question = q
+    else:
+        speech = text_to_speech(q)
+    st.audio(speech.data, format=speech.format)
 
-        # Record answer
-        audio_bytes = st.audio_input("Record your answer", format="wav")
+    if st.session_state.phase == 'answering':
+        error = st.session_state.pop('grading_error', None)
+        if error:
+            st.error(f"❌ Could not grade your answer ({error}). Please record it again.")
+        # One recorder per question, so a new question does not see the previous recording
+        # A failed attempt gets a fresh recorder too, or its recording would be graded again
+        key = f"answer_{len(st.session_state.asked)}_{st.session_state.get('attempt', 0)}"
+        audio_bytes = st.audio_input("Record your answer", format="wav", key=key)
         if audio_bytes:
-            temp_wav = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-            temp_wav.write(audio_bytes)
-            temp_wav.close()
+            st.session_state.answer_audio = audio_bytes.getvalue()
+            st.session_state.phase = 'grading'
 
-            ans_text = recognize_speech(temp_wav.name)
-            st.write(f"Your Answer: {ans_text}")
+    if st.session_state.phase == 'grading':
+        try:
+            # Parsed in memory; no temporary WAV file per answer
+            ans_text = recognize_speech(Recording.from_wav(st.session_state.answer_audio))
+            if not ans_text:
+                raise ValueError("no speech was recognized")
 
             # Evaluate
             start_ans = time.time()
             correct, feedback, new_diff, disorder = evaluate_answer(
-                st.session_state.context, q, ans_text
+                st.session_state.document, q, ans_text
             )
             elapsed = time.time() - start_ans
+        except Exception as e:
+            # Speech service or model failed: let the student record the answer again
+            st.session_state.phase = 'answering'
+            st.session_state.attempt = st.session_state.get('attempt', 0) + 1
+            st.session_state.grading_error = str(e)
+            st.rerun()
 
-            # Update stats
-            st.session_state.count += 1
-            if correct:
-                st.session_state.correct += 1
-                st.success("Correct! " + feedback)
-            else:
-                st.session_state.incorrect += 1
-                st.error("Incorrect! " + feedback)
-
-            # Adjust difficulty & disorder
-            st.session_state.difficulty = new_diff
-            if st.session_state.count >= 10 and not st.session_state.disorder:
-                st.session_state.disorder = disorder
-
-            # Log interaction
-            st.session_state.stats.append({
-                'question': q,
-                'answer': ans_text,
-                'correct': correct,
-                'feedback': feedback,
-                'time_taken': round(elapsed, 2)
-            })
-
-            if st.button("Stop Viva"):
-                data = {
-                    'name': name,
-                    'grade': grade,
-                    'subject': subject,
-                    'book': book,
-                    'questions_asked': st.session_state.count,
-                    'correct': st.session_state.correct,
-                    'incorrect': st.session_state.incorrect,
-                    'score': f"{st.session_state.correct}/{st.session_state.count}",
-                    'times': [s['time_taken'] for s in st.session_state.stats],
-                    'learning_disorder': st.session_state.disorder
-                }
-                save_results(data)
-                st.write("## Viva Summary")
-                st.write(f"Questions Asked: {data['questions_asked']}")
-                st.write(f"Correct: {data['correct']}")
-                st.write(f"Incorrect: {data['incorrect']}")
-                st.write(f"Score: {data['score']}")
-                st.write(f"Time per Question: {data['times']}")
-                st.session_state.started = False
+        # Update stats
+        st.session_state.count += 1
+        if correct:
+            st.session_state.correct += 1
+        else:
+            st.session_state.incorrect += 1
+
+        # Adjust difficulty & disorder
+        st.session_state.difficulty = new_diff
+        if st.session_state.count >= 10 and not st.session_state.disorder:
+            st.session_state.disorder = disorder
+
+        # Log interaction
+        st.session_state.stats.append({
+            'question': q,
+            'answer': ans_text,
+            'correct': correct,
+            'feedback': feedback,
+            'time_taken': round(elapsed, 2)
+        })
+        st.session_state.phase = 'next'
+
+    if st.session_state.phase == 'next':
+        last = st.session_state.stats[-1]
+        st.write(f"Your Answer: {last['answer']}")
+        if last['correct']:
+            st.success("Correct! " + last['feedback'])
+        else:
+            st.error("Incorrect! " + last['feedback'])
+
+        if st.button("Next Question"):
+            st.session_state.phase = 'asking'
+            st.rerun()
+
+        if st.button("Stop Viva"):
+            data = {
+                'name': name,
+                'grade': grade,
+                'subject': subject,
+                'book': book,
+                'questions_asked': st.session_state.count,
+                'correct': st.session_state.correct,
+                'incorrect': st.session_state.incorrect,
+                'score': f"{st.session_state.correct}/{st.session_state.count}",
+                'times': [s['time_taken'] for s in st.session_state.stats],
+                'learning_disorder': st.session_state.disorder
+            }
+            save_results(data)
+            st.write("## Viva Summary")
+            st.write(f"Questions Asked: {data['questions_asked']}")
+            st.write(f"Correct: {data['correct']}")
+            st.write(f"Incorrect: {data['incorrect']}")
+            st.write(f"Score: {data['score']}")
+            st.write(f"Time per Question: {data['times']}")
+            for future in st.session_state.prefetched.values():
+                future.cancel()
+            st.session_state.started = False
 
 if __name__ == '__main__':
-    main()
+    trace_session = session_id()
+    begin_rerun(trace_session)
+    try:
+        main()
+        if debug_enabled():
+            debug_panel(trace_session)
+    finally:
+        end_rerun(trace_session)
@@ -1,15 +1,18 @@
 import streamlit as st
-import fitz  # PyMuPDF
 from langchain_groq import ChatGroq
 from dotenv import load_dotenv
 import os
 import io
 
+from pdf_cache import pdf_text_cache
+from models import chat_model
+
 # ------------------ Load API & Init Model ------------------
 load_dotenv()
 groq_api_key = os.getenv("GROQ_API_KEY")
 
-llm = ChatGroq(
+llm = chat_model(
+    ChatGroq,
     temperature=0,
     groq_api_key=groq_api_key,
     model_name="llama3-70b-8192"
@@ -38,13 +41,12 @@ st.header("Upload the Book's PDF")
 book_pdf_file = st.file_uploader("Choose a PDF", type="pdf")
 
 if book_pdf_file is not None:
-    doc = fitz.open(stream=book_pdf_file.read(), filetype="pdf")
-    st.session_state.pdf_text_dict.clear()
-
-    for i, page in enumerate(doc):
-        text = page.get_text().strip()
-        if text:
-            st.session_state.pdf_text_dict[i + 1] = text
+    # Only look at the bytes when a different file is uploaded; other reruns reuse the session's pages.
+    # The book itself is parsed once per process, however many sessions upload it.
+    if st.session_state.get("pdf_file_id") != book_pdf_file.file_id:
+        _, document = pdf_text_cache.get_or_extract(book_pdf_file.getvalue())
+        st.session_state.pdf_text_dict = dict(document.items())
+        st.session_state.pdf_file_id = book_pdf_file.file_id
 
     st.success("✅ PDF uploaded and text extracted.")
 
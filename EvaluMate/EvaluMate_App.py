@@ -2,13 +2,14 @@ import streamlit as st
 import os
 import tempfile
 import speech_recognition as sr
-import pyttsx3
 from langchain.document_loaders import PyPDFLoader
 from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.vectorstores import FAISS
 from langchain.chains import RetrievalQA
 from langchain.llms import HuggingFaceHub
 
+from tts_worker import get_tts_worker
+
 # ========== Core Chatbot Engine ========== #
 class PDFChatEvaluator:
     def __init__(self, pdf_path):
@@ -17,7 +18,7 @@ class PDFChatEvaluator:
         self.docs = self.loader.load()
         self.vector_store = self._create_vectorstore()
         self.qa_chain = self._create_qa_chain()
-        self.engine = pyttsx3.init()
+        self.tts = get_tts_worker()
 
     def _create_vectorstore(self):
         embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
@@ -39,8 +40,9 @@ class PDFChatEvaluator:
         return evaluation
 
     def _speak(self, text):
-        self.engine.say(text)
-        self.engine.runAndWait()
+        # Returns at once; a new answer cuts off whatever is still being read
+        self.tts.cancel_all()
+        return self.tts.speak(text)
 
     def listen(self):
         recognizer = sr.Recognizer()
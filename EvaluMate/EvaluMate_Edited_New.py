@@ -5,12 +5,17 @@ from langchain.schema import SystemMessage, HumanMessage, AIMessage
 from dotenv import load_dotenv
 import os
 
+from pdf_cache import pdf_text_cache
+from models import chat_model
+from speculation import SPECULATE, changes_direction, feedback_and_question
+
 # ------------------ Load API Key ------------------ #
 load_dotenv()
 groq_api_key = os.getenv("GROQ_API_KEY")
 
 # ------------------ Initialize Model ------------------ #
-model = ChatGroq(
+model = chat_model(
+    ChatGroq,
     temperature=0,
     groq_api_key=groq_api_key,
     model_name="gemma2-9b-it"
@@ -52,10 +57,9 @@ if book_pdf_file is not None:
     st.write(f"✅ PDF Uploaded | Total Pages: {len(doc)}")
 
     st.session_state.pdf_text_dict.clear()
-    for i, page in enumerate(doc):
-        text = page.get_text().strip()
-        if text:
-            st.session_state.pdf_text_dict[i + 1] = text
+    # Parsed once per book per process, not on every rerun
+    _, document = pdf_text_cache.get_or_extract(pdf_bytes)
+    st.session_state.pdf_text_dict.update(document.items())
 
 # ------------------ Display PDF Page Text ------------------ #
 if st.session_state.pdf_text_dict:
@@ -116,17 +120,28 @@ Ask one question at a time directly based on this content. After each student an
                 # Add user's answer
                 st.session_state.chat_history.append(HumanMessage(content=user_answer))
 
-                # Get AI feedback
-                feedback = model.invoke(st.session_state.chat_history)
-                st.session_state.chat_history.append(AIMessage(content=feedback.content))
+                # Get AI feedback, and with SPECULATE the next question at the same time
+                if SPECULATE:
+                    feedback, next_question = feedback_and_question(model, st.session_state.chat_history)
+                else:
+                    feedback, next_question = model.invoke(st.session_state.chat_history).content, None
+                st.session_state.chat_history.append(AIMessage(content=feedback))
 
                 # Show feedback
                 st.success("✅ Feedback:")
-                st.write(feedback.content)
-
-                # Reset state for next question
-                st.session_state.awaiting_answer = False
-                st.session_state.current_question = None
+                st.write(feedback)
+
+                if next_question:
+                    # Already generated, so the next rerun shows it without another model call
+                    st.session_state.chat_history.append(AIMessage(content=next_question))
+                    st.session_state.current_question = next_question
+                elif SPECULATE and changes_direction(feedback):
+                    # The feedback asks the student something: their reply answers it, no new question yet
+                    st.session_state.current_question = feedback
+                else:
+                    # Reset state for next question
+                    st.session_state.awaiting_answer = False
+                    st.session_state.current_question = None
                 st.session_state.answer_box = ""  # Clear the input box
                 st.rerun()
 
@@ -1,21 +1,28 @@
 import streamlit as st
-import fitz  # PyMuPDF
 from langchain.schema import HumanMessage, SystemMessage
 from langchain_groq import ChatGroq
 from dotenv import load_dotenv
 import os
 import json
 
+from pdf_cache import pdf_text_cache
+from qa_stream_parser import LEVEL_NAMES, QAJsonStreamParser
+from models import chat_model
+
 # Load environment variables
 load_dotenv()
 
 groq_api_key = os.getenv("GROQ_API_KEY")
-model = ChatGroq(
+model = chat_model(
+    ChatGroq,
     temperature=0,
     groq_api_key=groq_api_key,
     model_name="meta-llama/llama-guard-4-12b"  # or "gemma2-9b-it" if available
 )
 
+# "easy", "moderate", "difficult": the keys of questions_dict, in the order they are asked
+LEVELS = [level.lower() for level in dict.fromkeys(LEVEL_NAMES.values())]
+
 st.title("EvaluMate: AI-Powered Viva Bot")
 
 # Initialize session states
@@ -39,11 +46,9 @@ book_pdf_file = st.file_uploader("Choose a Book's PDF file", type="pdf")
 # Extract Text from PDF
 if book_pdf_file is not None and not st.session_state.pdf_text_dict:
     pdf_bytes = book_pdf_file.read()
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    for i, page in enumerate(doc):
-        text = page.get_text().strip()
-        if text:
-            st.session_state.pdf_text_dict[i + 1] = text
+    # Parsed once per book per process, not on every rerun
+    _, document = pdf_text_cache.get_or_extract(pdf_bytes)
+    st.session_state.pdf_text_dict.update(document.items())
 
     full_text = "\n".join(st.session_state.pdf_text_dict.values())[:8000]  # Truncate to fit token limits
 
@@ -56,19 +61,34 @@ if book_pdf_file is not None and not st.session_state.pdf_text_dict:
         )
         
         prompt_str = system_prompt + "\n\n" + full_text
-        response = model.invoke([
+        # Parse the JSON while it streams so each question shows up as soon as its object closes
+        parser = QAJsonStreamParser()
+        questions_dict = {level: [] for level in LEVELS}
+        progress = st.empty()
+        for piece in model.stream([
             SystemMessage(content="You are an examiner."),
             HumanMessage(content=prompt_str)
-        ])
-
-        st.session_state.questions_dict = json.loads(response.content)
-        st.session_state.viva_status = "ready"
-        st.success("Questions generated. Click Start to begin viva.")
+        ]):
+            for qa in parser.feed(piece.content):
+                questions_dict[qa["level"].lower()].append({"question": qa["question"], "answer": qa["answer"]})
+                count = sum(len(qs) for qs in questions_dict.values())
+                progress.markdown(f"**{count} questions ready** ({qa['level']}): {qa['question']}")
+
+        if parser.skipped:
+            st.warning(f"⚠️ Skipped {len(parser.skipped)} malformed question(s) in the model's response.")
+        if not any(questions_dict.values()):
+            # Leave the book unloaded so the next rerun generates again
+            st.session_state.pdf_text_dict = {}
+            st.error("❌ No questions could be generated from this book. Please try again.")
+        else:
+            st.session_state.questions_dict = questions_dict
+            st.session_state.viva_status = "ready"
+            st.success("Questions generated. Click Start to begin viva.")
 
 # --- Viva Logic ---
 def get_all_questions():
     all_qs = []
-    for level in ["easy", "moderate", "difficult"]:
+    for level in LEVELS:
         all_qs.extend(st.session_state.questions_dict.get(level, []))
     return all_qs
 
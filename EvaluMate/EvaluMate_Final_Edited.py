@@ -6,11 +6,17 @@ from dotenv import load_dotenv
 import os
 from langchain_groq import ChatGroq
 
+from pdf_cache import pdf_text_cache
+from streaming import StreamTiming, timed_stream
+from models import chat_model
+from speculation import SPECULATE, SpeculativeTurn, changes_direction
+
 load_dotenv()
 
 groq_api_key = os.getenv("GROQ_API_KEY")
 
-model = ChatGroq(
+model = chat_model(
+    ChatGroq,
     temperature=0,
     groq_api_key = groq_api_key,
     model_name = "gemma2-9b-it" 
@@ -47,10 +53,9 @@ if book_pdf_file is not None:
     st.write(f"Total Pages: {len(doc)}")
 
     st.session_state.pdf_text_dict.clear()
-    for i, page in enumerate(doc):
-        text = page.get_text().strip()
-        if text:
-            st.session_state.pdf_text_dict[i + 1] = text
+    # Parsed once per book per process, not on every rerun
+    _, document = pdf_text_cache.get_or_extract(pdf_bytes)
+    st.session_state.pdf_text_dict.update(document.items())
 
 # --- Display extracted content per page ---
 if st.session_state.pdf_text_dict:
@@ -108,15 +113,32 @@ Ask me questions directly based on this content. After I respond, evaluate my an
         if st.button("Submit Answer"):
             if user_answer.strip():
                 st.session_state.chat_history.append(HumanMessage(content=user_answer))
-                feedback = model.invoke(st.session_state.chat_history)
-                st.session_state.chat_history.append(AIMessage(content=feedback.content))
 
+                # Stream the feedback as it is generated; it joins the history once complete
                 st.success("**Feedback:**")
-                st.write(feedback.content)
-
-                # Reset state for next question
-                st.session_state.awaiting_answer = False
-                st.session_state.current_question = None
+                timing = StreamTiming()
+                if SPECULATE:
+                    # The next question is generated at the same time as the feedback
+                    turn = SpeculativeTurn(model, st.session_state.chat_history)
+                    st.write_stream(timed_stream(turn.chunks(), timing))
+                    feedback, next_question = turn.result()
+                else:
+                    feedback = st.write_stream(timed_stream(model.stream(st.session_state.chat_history), timing))
+                    next_question = None
+                st.session_state.chat_history.append(AIMessage(content=feedback))
+                st.caption(timing.summary())
+
+                if next_question:
+                    # Already generated, so the next rerun shows it without another model call
+                    st.session_state.chat_history.append(AIMessage(content=next_question))
+                    st.session_state.current_question = next_question
+                elif SPECULATE and changes_direction(feedback):
+                    # The feedback asks the student something: their reply answers it, no new question yet
+                    st.session_state.current_question = feedback
+                else:
+                    # Reset state for next question
+                    st.session_state.awaiting_answer = False
+                    st.session_state.current_question = None
             else:
                 st.warning("Please enter an answer before submitting.")
 
@@ -1,39 +1,61 @@
 import streamlit as st
-import fitz  # PyMuPDF
 from langchain_groq import ChatGroq
 from dotenv import load_dotenv
 import os
 import io
-import pyttsx3
-import sounddevice as sd
-import numpy as np
-import scipy.io.wavfile as wav
-import speech_recognition as sr
 import time
 
+from pdf_cache import pdf_text_cache
+from tts_cache import tts_cache
+from question_generation import LEVELS, QUESTIONS_PER_LEVEL, bank_version, shared_question_job
+from question_store import QuestionStore
+from item_selector import ItemSelector
+from grading import grade_answer, grade_answers, model_id
+from grading_cache import GradingCache
+from models import chat_model
+from stt_backends import get_recognizer, listen
+from tracing import begin_rerun, debug_enabled, debug_panel, end_rerun, session_id, span
+
 # ------------------ Load API & Init Model ------------------
 load_dotenv()
 groq_api_key = os.getenv("GROQ_API_KEY")
 
-llm = ChatGroq(
+MODEL_NAME = "llama3-70b-8192"
+# Tokens kept free for the instructions and the generated Q/A pairs of each chunk
+GENERATION_RESERVE_TOKENS = 2500
+# Chunks drafted in parallel when generating questions
+LLM_CONCURRENCY = int(os.getenv("EVALUMATE_LLM_CONCURRENCY", "4"))
+# How long to wait for a streamed question before giving up
+QUESTION_TIMEOUT_SECONDS = 60
+# Questions per level generated into the shared bank when it runs low (each session uses QUESTIONS_PER_LEVEL)
+POOL_QUESTIONS_PER_LEVEL = 10
+# Refills draft from the same chunks; at temperature 0 they would only repeat the stored questions
+REFILL_TEMPERATURE = 0.9
+
+llm = chat_model(
+    ChatGroq,
     temperature=0,
     groq_api_key=groq_api_key,
-    model_name="llama3-70b-8192"
+    model_name=MODEL_NAME
 )
 
 st.title("📘 EvaluMate - Viva Question Evaluator")
 
 # ------------------ Session State ------------------
-if "pdf_text_dict" not in st.session_state:
-    st.session_state.pdf_text_dict = {}
+if "pdf_document" not in st.session_state:
+    st.session_state.pdf_document = None
 if "qa_dict" not in st.session_state:
     st.session_state.qa_dict = {}
 if "all_qas" not in st.session_state:
     st.session_state.all_qas = []
 if "qa_index" not in st.session_state:
     st.session_state.qa_index = 0
-if "used_q_indices" not in st.session_state:
-    st.session_state.used_q_indices = []
+if "selector" not in st.session_state:
+    st.session_state.selector = ItemSelector(LEVELS)
+
+# Everything traced during this script run is grouped under one "rerun" span
+trace_session = session_id()
+begin_rerun(trace_session)
 
 # ------------------ Input Fields ------------------
 name = st.text_input("Name : ")
@@ -46,120 +68,121 @@ st.header("Upload the Book's PDF")
 book_pdf_file = st.file_uploader("Choose a PDF", type="pdf")
 
 if book_pdf_file is not None:
-    doc = fitz.open(stream=book_pdf_file.read(), filetype="pdf")
-    st.session_state.pdf_text_dict.clear()
-
-    for i, page in enumerate(doc):
-        text = page.get_text().strip()
-        if text:
-            st.session_state.pdf_text_dict[i + 1] = text
+    # Only look at the bytes when a different file is uploaded; other reruns reuse the session's document.
+    # The document is shared through the process-wide cache, so it must be treated as read-only.
+    if st.session_state.get("pdf_file_id") != book_pdf_file.file_id:
+        pdf_key, document = pdf_text_cache.get_or_extract(book_pdf_file.getvalue())
+        st.session_state.pdf_key = pdf_key
+        st.session_state.pdf_document = document
+        st.session_state.pdf_file_id = book_pdf_file.file_id
 
     st.success("✅ PDF uploaded and text extracted.")
 
 # ------------------ Page Viewer ------------------
-if st.session_state.pdf_text_dict:
-    selected_page = st.selectbox("View a Page:", list(st.session_state.pdf_text_dict.keys()))
-    st.text_area("Extracted Text", st.session_state.pdf_text_dict[selected_page], height=300)
+if st.session_state.pdf_document:
+    selected_page = st.selectbox("View a Page:", st.session_state.pdf_document.page_numbers)
+    st.text_area("Extracted Text", st.session_state.pdf_document.page(selected_page), height=300)
 
 # ------------------ Question Generation ------------------
+@st.cache_resource
+def get_question_store():
+    return QuestionStore()
+
+question_store = get_question_store()
+pool_version = bank_version(model_id(llm))
+
+def add_question(qa):
+    st.session_state.all_qas.append(qa)
+    st.session_state.qa_dict[qa["level"]].append(qa)
+    st.session_state.selector.add(qa["level"])
+    # Start synthesizing its audio now so "Read Question Aloud" plays at once
+    tts_cache.prefetch([qa["question"]])
+
+def sync_streamed_questions():
+    """Take questions that have arrived from the background generation job since the last rerun.
+
+    The job keeps filling the stored pool past this session's 5 per level; only those are used here.
+    """
+    job = st.session_state.get("question_job")
+    if job is None:
+        return
+    new_items = job.items_since(st.session_state.job_cursor)
+    st.session_state.job_cursor += len(new_items)
+    for qa in new_items:
+        if len(st.session_state.qa_dict[qa["level"]]) < QUESTIONS_PER_LEVEL:
+            add_question(qa)
+            question_store.mark_used([qa["id"]])
+
+def record_generation_run(job, key, started_at):
+    # A failed run says nothing about whether the book has more questions to give
+    if job.error is None:
+        question_store.record_run(key, pool_version, started_at)
+
+def questions_pending():
+    """True while the background job may still add questions to this session."""
+    job = st.session_state.get("question_job")
+    return (
+        job is not None
+        and not job.done
+        and len(st.session_state.all_qas) < QUESTIONS_PER_LEVEL * len(LEVELS)
+    )
+
 if st.button("🔍 Generate Viva Questions"):
-    if st.session_state.pdf_text_dict:
-        full_text = "\n\n".join(st.session_state.pdf_text_dict.values())
-
-        prompt = f"""
-You are an expert examiner. Based on the following content:
-
---- CONTENT START ---
-{full_text}
---- CONTENT END ---
-
-Generate 15 viva questions along with their answers:
-- 5 Easy
-- 5 Moderate
-- 5 Difficult
-
-Format exactly like this:
-
-Easy:
-Q1: ...
-A1: ...
-...
-
-Moderate:
-Q6: ...
-A6: ...
-...
-
-Difficult:
-Q11: ...
-A11: ...
-...
-        """
-
-        response = llm.invoke(prompt)
-        raw_output = response.content.strip()
-
-        sections = {"Easy": [], "Moderate": [], "Difficult": []}
-        current_section = None
-
-        for line in raw_output.splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            if "Easy" in line:
-                current_section = "Easy"
-            elif "Moderate" in line:
-                current_section = "Moderate"
-            elif "Difficult" in line:
-                current_section = "Difficult"
-            elif current_section and (line.startswith("Q") or line.startswith("A")):
-                sections[current_section].append(line)
-
-        qa_dict = {}
-        all_qas = []
-        for level, lines in sections.items():
-            for i in range(0, len(lines), 2):
-                try:
-                    q = lines[i].split(":", 1)[1].strip()
-                    a = lines[i + 1].split(":", 1)[1].strip()
-                    all_qas.append({
-                        "level": level,
-                        "question": q,
-                        "answer": a,
-                        "user_answer": "",
-                        "score": None
-                    })
-                except:
-                    continue
-            qa_dict[level] = all_qas
-
-        st.session_state.qa_dict = qa_dict
-        st.session_state.all_qas = all_qas
+    if st.session_state.pdf_document:
+        st.session_state.qa_dict = {level: [] for level in LEVELS}
+        st.session_state.all_qas = []
         st.session_state.qa_index = 0
-        st.session_state.used_q_indices = []
-        st.success("✅ Viva questions generated.")
+        st.session_state.selector = ItemSelector(LEVELS)
+        st.session_state.question_job = None
+        st.session_state.job_cursor = 0
+        pdf_key = st.session_state.pdf_key
+
+        if not question_store.needs_refill(pdf_key, pool_version, LEVELS, QUESTIONS_PER_LEVEL):
+            # Someone already generated questions for this book: draw the least-used ones
+            for qa in question_store.draw(pdf_key, pool_version, LEVELS, QUESTIONS_PER_LEVEL):
+                add_question(qa)
+            st.success("✅ Viva questions loaded from the question bank.")
+        else:
+            # Questions stream in on a background thread and are saved to the bank as they arrive;
+            # the viva starts once the first one is here. Sessions opening the same book meanwhile
+            # follow the job that is already running instead of starting another.
+            refill = question_store.count(pdf_key, pool_version) > 0
+            started_at = time.time()
+            st.session_state.question_job = shared_question_job(
+                (pdf_key, pool_version),
+                llm.bind(temperature=REFILL_TEMPERATURE) if refill else llm,
+                st.session_state.pdf_document,
+                MODEL_NAME,
+                per_level=POOL_QUESTIONS_PER_LEVEL,
+                max_concurrency=LLM_CONCURRENCY,
+                reserve=GENERATION_RESERVE_TOKENS,
+                on_item=lambda qa, key=pdf_key: question_store.add(key, pool_version, [qa]),
+                on_done=lambda job, key=pdf_key: record_generation_run(job, key, started_at),
+            )
+            with st.spinner("Generating viva questions..."):
+                st.session_state.question_job.wait_for(1, timeout=QUESTION_TIMEOUT_SECONDS)
+            if st.session_state.question_job.items:
+                st.success("✅ First viva question ready.")
+
+sync_streamed_questions()
+if st.session_state.get("question_job") is not None:
+    job = st.session_state.question_job
+    if job.error and not st.session_state.all_qas:
+        st.error(f"❌ Question generation failed: {job.error}")
+    elif questions_pending():
+        st.caption(f"⏳ {len(st.session_state.all_qas)} questions ready, generating the rest in the background...")
 
 # ------------------ Answer Evaluation ------------------
-def evaluate_answer(question, correct_answer, user_answer):
-    eval_prompt = f"""
-You are a strict examiner. Here is the question, the correct answer, and a student's answer.
-
-Question: {question}
+@st.cache_resource
+def get_grading_cache():
+    return GradingCache()
 
-Correct Answer: {correct_answer}
+grading_cache = get_grading_cache()
 
-Student's Answer: {user_answer}
-
-Evaluate the student's answer strictly and give a score out of 10. Just reply with a number between 0 and 10. No explanation, no extra words.
-"""
-    result = llm.invoke(eval_prompt)
-    try:
-        score = int(result.content.strip())
-        return max(0, min(10, score))
-    except:
-        return 0
+def evaluate_answer(question, correct_answer, user_answer):
+    """Score out of 10, as a GradeResult; `error` is set instead if the reply could not be graded."""
+    return grade_answer(llm, question, correct_answer, user_answer, cache=grading_cache)
 
-# ------------------ Adaptive Question Selector ------------------
 # ------------------ Adaptive Question Selector ------------------
 def get_next_question(score):
     if score < 4:
@@ -169,36 +192,38 @@ def get_next_question(score):
     else:
         level = "Difficult"
 
-    # First try to find a question of the desired level
-    for i, qa in enumerate(st.session_state.all_qas):
-        if qa["level"] == level and i not in st.session_state.used_q_indices:
-            st.session_state.qa_index = i
-            return
-    
-    # If none found, find any unused question
-    for i, qa in enumerate(st.session_state.all_qas):
-        if i not in st.session_state.used_q_indices:
-            st.session_state.qa_index = i
-            return
+    # Unused question of the desired level, else of the nearest level
+    index = st.session_state.selector.next_unused(level)
+    if index is not None:
+        st.session_state.selector.visit(index)
+        st.session_state.qa_index = index
+
+# ------------------ Speech Recognition ------------------
+@st.cache_resource
+def get_speech_recognizer():
+    # Backend from EVALUMATE_STT; a local model is loaded once per process
+    return get_recognizer()
 
 # ------------------ Viva UI ------------------
 if st.session_state.all_qas:
     st.subheader("🧠 Viva Questions")
 
+    selector = st.session_state.selector
     current = st.session_state.qa_index
+    if selector.current is None:
+        selector.visit(current)
     qa = st.session_state.all_qas[current]
     total_questions = len(st.session_state.all_qas)
-    answered_count = len(st.session_state.used_q_indices)
+    answered_count = selector.used_count
 
     # Create columns for navigation buttons
     col1, col2, col3 = st.columns([1, 4, 1])
     
     with col1:
-        # Previous button - only enabled if not on first question
-        # if st.button("⬅️ Previous", disabled=(current == 0)):
-        #     st.session_state.qa_index = current - 1
-        #     st.rerun()
-            pass
+        # Previous button - back to the question shown before this one
+        if st.button("⬅️ Previous", disabled=not selector.can_go_back()):
+            st.session_state.qa_index = selector.back()
+            st.rerun()
             
     with col2:
         # Show current question position and progress
@@ -206,11 +231,10 @@ if st.session_state.all_qas:
         st.markdown(f"**Progress: {answered_count} of {total_questions} answered**")
         
     with col3:
-        # Next button - only enabled if not on last question
-        # if st.button("Next ➡️", disabled=(current == total_questions - 1)):
-        #     st.session_state.qa_index = current + 1
-        #     st.rerun()
-        pass
+        # Next button - forward again after going back
+        if st.button("Next ➡️", disabled=not selector.can_go_forward()):
+            st.session_state.qa_index = selector.forward()
+            st.rerun()
 
     st.markdown(f"**Q:** {qa['question']}")
     
@@ -219,35 +243,43 @@ if st.session_state.all_qas:
         st.success(f"Scored: {qa['score']}/10")
 
 
-    # TTS using pyttsx3
+    # TTS: audio is synthesized in the background as questions arrive, so this is normally instant
     if st.button("🔊 Read Question Aloud"):
         try:
-            engine = pyttsx3.init()
-            engine.say(qa["question"])
-            engine.runAndWait()
+            with span("tts.play", chars=len(qa["question"])):
+                speech = tts_cache.speech(qa["question"], timeout=QUESTION_TIMEOUT_SECONDS)
+            st.audio(speech.data, format=speech.format, autoplay=True)
         except Exception as e:
             st.warning(f"TTS failed: {e}")
 
     # Audio recording and transcription
-    record_seconds = st.slider("Select recording time (seconds):", 3, 15, 5)
+    max_record_seconds = st.slider("Maximum answer length (seconds):", 10, 60, 30)
+    st.caption("Recording stops by itself once you stop speaking.")
 
     if st.button("🎙️ Record Your Answer"):
         try:
             st.info("Recording... Speak now!")
             fs = 44100
-            audio = sd.rec(int(record_seconds * fs), samplerate=fs, channels=1, dtype='int16')
-            sd.wait()
-            wav.write("temp.wav", fs, audio)
-
-            # Transcribe
-            recognizer = sr.Recognizer()
-            with sr.AudioFile("temp.wav") as source:
-                audio_data = recognizer.record(source)
-                text = recognizer.recognize_google(audio_data)
-
-                st.session_state.all_qas[current]["user_answer"] = text
-                st.success("✅ Transcription Successful")
-                st.text_area("Your Answer (from audio)", value=text, key=f"audio_text_{current}")
+            recognizer = get_speech_recognizer()
+            transcript = st.empty()
+            with span("stt.listen", max_seconds=max_record_seconds, backend=recognizer.name) as trace:
+                # Streaming recognizers transcribe while the student is still speaking
+                recording, text = listen(
+                    recognizer,
+                    on_partial=lambda partial: transcript.markdown(f"🗣️ _{partial}_"),
+                    max_seconds=max_record_seconds,
+                    sample_rate=fs,
+                )
+                trace.set(audio_seconds=round(recording.seconds, 2))
+            transcript.empty()
+            # Kept in this session's memory only; nothing is written to disk
+            st.session_state.recording = recording
+            if not text:
+                raise RuntimeError("no speech was recognized, please try again")
+
+            st.session_state.all_qas[current]["user_answer"] = text
+            st.success("✅ Transcription Successful")
+            st.text_area("Your Answer (from audio)", value=text, key=f"audio_text_{current}")
 
         except Exception as e:
             st.error(f"❌ Error during recording/transcription: {e}")
@@ -257,17 +289,26 @@ if st.session_state.all_qas:
 
     if st.button("✅ Submit Answer"):
         st.session_state.all_qas[current]["user_answer"] = manual_answer
-        score = evaluate_answer(qa["question"], qa["answer"], manual_answer)
+        result = evaluate_answer(qa["question"], qa["answer"], manual_answer)
+        if result.error is not None:
+            st.error(f"❌ Could not grade this answer, please submit again: {result.error}")
+            st.stop()
+        score = result.score
         st.session_state.all_qas[current]["score"] = score
         
-        # Only add to used indices if not already added
-        if current not in st.session_state.used_q_indices:
-            st.session_state.used_q_indices.append(current)
+        # Marking an already answered question again is a no-op
+        selector.mark_used(current)
             
         st.success(f"✅ Answer saved and scored: {score}/10")
         time.sleep(1)  # Short delay to allow user to see the message
+        # Everything answered so far but more questions are still streaming in: wait for the next one
+        while questions_pending() and selector.all_used:
+            cursor = st.session_state.job_cursor
+            if st.session_state.question_job.wait_for(cursor + 1, timeout=QUESTION_TIMEOUT_SECONDS) <= cursor:
+                break
+            sync_streamed_questions()
         # Only run adaptive selection if not all questions are answered
-        if len(st.session_state.used_q_indices) < len(st.session_state.all_qas):
+        if not selector.all_used:
             # Preserve the current index for manual navigation
             current_index_before_adaptive = st.session_state.qa_index
             
@@ -306,6 +347,30 @@ def save_qa_to_text_file(name, grade, subject, book_title, all_qas):
 if st.session_state.all_qas:
     st.subheader("📄 Download Q&A + Scores")
 
+    # Grade every answered-but-unscored question in one batched pass
+    ungraded = [(i, qa) for i, qa in enumerate(st.session_state.all_qas) if qa["user_answer"] and qa["score"] is None]
+    if ungraded and st.button(f"📝 Grade All Answers ({len(ungraded)})"):
+        with st.spinner("Grading answers..."):
+            results = grade_answers(
+                llm,
+                [(qa["question"], qa["answer"], qa["user_answer"]) for _, qa in ungraded],
+                max_concurrency=LLM_CONCURRENCY,
+                cache=grading_cache,
+            )
+        failed = 0
+        for (index, qa), result in zip(ungraded, results):
+            if result.error is None:
+                qa["score"] = result.score
+                # Graded questions are done, as with Submit Answer
+                st.session_state.selector.mark_used(index)
+            else:
+                failed += 1
+        if failed:
+            st.warning(f"⚠️ {failed} answer(s) could not be graded; try again.")
+        st.success(f"✅ Graded {len(ungraded) - failed} answer(s).")
+        stats = grading_cache.stats()
+        st.caption(f"Grading cache: {stats['memory_hits'] + stats['disk_hits']} hits, {stats['misses']} misses")
+
     if st.button("📥 Generate Report"):
         file_content = save_qa_to_text_file(name, grade, subject, book_title, st.session_state.all_qas)
         st.download_button(
@@ -314,3 +379,8 @@ if st.session_state.all_qas:
             file_name="viva_evaluation_report.txt",
             mime="text/plain"
         )
+
+# ------------------ Debug ------------------
+if debug_enabled():
+    debug_panel(trace_session)
+end_rerun(trace_session)
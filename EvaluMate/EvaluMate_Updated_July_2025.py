@@ -1,20 +1,21 @@
 import streamlit as st
-import fitz  # PyMuPDF
 from langchain_groq import ChatGroq
 from dotenv import load_dotenv
 import os
 import io
-import pyttsx3
-import sounddevice as sd
-import numpy as np
-import scipy.io.wavfile as wav
 import speech_recognition as sr
 
+from pdf_cache import pdf_text_cache
+from models import chat_model
+from audio_capture import record_until_silence
+from tts_worker import get_tts_worker
+
 # ------------------ Load API & Init Model ------------------
 load_dotenv()
 groq_api_key = os.getenv("GROQ_API_KEY")
 
-llm = ChatGroq(
+llm = chat_model(
+    ChatGroq,
     temperature=0,
     groq_api_key=groq_api_key,
     model_name="llama3-70b-8192"
@@ -45,13 +46,12 @@ st.header("Upload the Book's PDF")
 book_pdf_file = st.file_uploader("Choose a PDF", type="pdf")
 
 if book_pdf_file is not None:
-    doc = fitz.open(stream=book_pdf_file.read(), filetype="pdf")
-    st.session_state.pdf_text_dict.clear()
-
-    for i, page in enumerate(doc):
-        text = page.get_text().strip()
-        if text:
-            st.session_state.pdf_text_dict[i + 1] = text
+    # Only look at the bytes when a different file is uploaded; other reruns reuse the session's pages.
+    # The book itself is parsed once per process, however many sessions upload it.
+    if st.session_state.get("pdf_file_id") != book_pdf_file.file_id:
+        _, document = pdf_text_cache.get_or_extract(book_pdf_file.getvalue())
+        st.session_state.pdf_text_dict = dict(document.items())
+        st.session_state.pdf_file_id = book_pdf_file.file_id
 
     st.success("✅ PDF uploaded and text extracted.")
 
@@ -182,35 +182,33 @@ if st.session_state.all_qas:
     st.markdown(f"**Question {len(st.session_state.used_q_indices) + 1} of 15** ({qa['level']})")
     st.markdown(f"**Q:** {qa['question']}")
 
-    # TTS using pyttsx3
+    # TTS using pyttsx3 on a background worker, so the page stays responsive while it speaks
     if st.button("🔊 Read Question Aloud"):
         try:
-            engine = pyttsx3.init()
-            engine.say(qa["question"])
-            engine.runAndWait()
+            tts = get_tts_worker()
+            tts.wait_ready(timeout=10)
+            tts.cancel_all()
+            tts.speak(qa["question"])
         except Exception as e:
             st.warning(f"TTS failed: {e}")
 
     # Audio recording and transcription
-    record_seconds = st.slider("Select recording time (seconds):", 3, 15, 5)
+    max_record_seconds = st.slider("Maximum answer length (seconds):", 10, 60, 30)
+    st.caption("Recording stops by itself once you stop speaking.")
 
     if st.button("🎙️ Record Your Answer"):
         try:
             st.info("Recording... Speak now!")
             fs = 44100
-            audio = sd.rec(int(record_seconds * fs), samplerate=fs, channels=1, dtype='int16')
-            sd.wait()
-            wav.write("temp.wav", fs, audio)
+            recording = record_until_silence(max_seconds=max_record_seconds, sample_rate=fs)
 
-            # Transcribe
+            # Transcribe straight from the recorded buffer; nothing is written to disk
             recognizer = sr.Recognizer()
-            with sr.AudioFile("temp.wav") as source:
-                audio_data = recognizer.record(source)
-                text = recognizer.recognize_google(audio_data)
+            text = recognizer.recognize_google(recording.audio_data())
 
-                st.session_state.all_qas[current]["user_answer"] = text
-                st.success("✅ Transcription Successful")
-                st.text_area("Your Answer (from audio)", value=text, key=f"audio_text_{current}")
+            st.session_state.all_qas[current]["user_answer"] = text
+            st.success("✅ Transcription Successful")
+            st.text_area("Your Answer (from audio)", value=text, key=f"audio_text_{current}")
 
         except Exception as e:
             st.error(f"❌ Error during recording/transcription: {e}")
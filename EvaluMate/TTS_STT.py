@@ -1,14 +1,13 @@
-import sounddevice as sd
-import numpy as np
 import speech_recognition as sr
-import pyttsx3
 
-# Initialize recognizer and TTS engine
-recognizer = sr.Recognizer()
-tts_engine = pyttsx3.init()
+from stt_backends import get_recognizer, listen
+from tts_worker import get_tts_worker
 
-# Configure TTS settings
-def configure_tts_engine():
+# Initialize recognizer (EVALUMATE_STT=google or vosk)
+recognizer = get_recognizer()
+
+# Configure TTS settings (runs once, on the TTS worker thread that owns the engine)
+def configure_tts_engine(tts_engine):
     tts_engine.setProperty('rate', 150)  # Speed
     tts_engine.setProperty('volume', 1.0)  # Volume
 
@@ -17,44 +16,56 @@ def configure_tts_engine():
     if len(voices) > 1:
         tts_engine.setProperty('voice', voices[1].id)
 
-# Text to Speech function
+# Text to Speech function: queues the text and returns a Future at once
 def speak_text(text):
     print("Speaking:", text)
-    tts_engine.say(text)
-    tts_engine.runAndWait()
-
-# Record audio from mic
-def record_audio(duration=5, samplerate=16000):
-    print(f"\n🎙️ Recording for {duration} seconds...")
-    audio_data = sd.rec(int(duration * samplerate), samplerate=samplerate, channels=1, dtype='int16')
-    sd.wait()
-    print("✅ Recording complete.")
-    return np.squeeze(audio_data)
-
-# Convert recorded audio to text
-def speech_to_text(audio_array, sample_rate=16000):
-    audio = sr.AudioData(audio_array.tobytes(), sample_rate, 2)
+    return get_tts_worker(configure_tts_engine).speak(text)
+
+# Record audio from mic (kept in memory) until the speaker goes quiet, transcribing as it comes in
+def listen_and_transcribe(max_duration=30, samplerate=16000):
+    print(f"\n🎙️ Recording (up to {max_duration} seconds, stops when you stop speaking)...")
     try:
-        print("🧠 Recognizing speech...")
-        text = recognizer.recognize_google(audio)
-        print("📝 You said:", text)
-        return text
-    except sr.UnknownValueError:
+        recording, text = listen(
+            recognizer,
+            on_partial=lambda partial: print(f"\r🧠 {partial}", end="", flush=True),
+            max_seconds=max_duration,
+            sample_rate=samplerate,
+        )
+    except sr.RequestError:
+        print("\n⚠️ Could not request results from the speech recognition service.")
+        return None
+    print(f"\n✅ Recording complete ({recording.seconds:.1f} seconds of speech).")
+    if not text:
         print("❌ Could not understand audio.")
+        return None
+    print("📝 You said:", text)
+    return text
+
+# Convert an already recorded answer (an audio_capture.Recording) to text
+def speech_to_text(recording):
+    try:
+        print("🧠 Recognizing speech...")
+        text = recognizer.transcribe(recording)
     except sr.RequestError:
-        print("⚠️ Could not request results from Google API.")
-    return None
+        print("⚠️ Could not request results from the speech recognition service.")
+        return None
+    if not text:
+        print("❌ Could not understand audio.")
+        return None
+    print("📝 You said:", text)
+    return text
 
 # Main flow
 if __name__ == "__main__":
-    configure_tts_engine()
+    # Start the engine while the student is still answering
+    get_tts_worker(configure_tts_engine)
 
-    # Step 1: Record speech and convert to text
-    audio_data = record_audio(duration=5)
-    recognized_text = speech_to_text(audio_data)
+    # Step 1: Record speech and convert it to text while it is recorded
+    recognized_text = listen_and_transcribe()
 
     # Step 2: Speak the recognized text
     if recognized_text:
-        speak_text(recognized_text)
+        speech = speak_text(recognized_text)
     else:
-        speak_text("Sorry, I could not understand what you said.")
+        speech = speak_text("Sorry, I could not understand what you said.")
+    speech.result()
@@ -0,0 +1,188 @@
+'''
+In-memory audio capture for the EvaluMate apps.
+
+Recordings stay as numpy int16 arrays for the whole round trip: the mic frames
+from `record_until_silence()`, or the WAV bytes from `st.audio_input`, are
+wrapped in a Recording. `audio_data()` hands the recognizers a memoryview of the same
+buffer. Nothing is written to disk, so concurrent sessions cannot overwrite
+each other's answer the way they did with a shared temp.wav.
+
+`record_until_silence()` reads the microphone in short frames and stops once
+the student has been quiet for `trailing_silence` seconds, or at
+`max_seconds`. Speech is detected from per-frame RMS energy, computed for all
+frames of a batch at once in numpy, against a threshold calibrated on the
+room's noise in the first few frames. Leading and trailing silence are trimmed
+before the recording is returned, so less audio goes to speech recognition.
+'''
+import io
+import math
+import queue
+import wave
+
+import numpy as np
+import speech_recognition as sr
+
+DEFAULT_SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # int16
+
+FRAME_MS = 30
+# Frames used to measure the background noise when a recording starts
+CALIBRATION_FRAMES = 8
+# Speech must be this many times louder (RMS) than the noise floor, within these int16 RMS limits
+NOISE_FACTOR = 3.0
+MIN_SPEECH_RMS = 300
+MAX_SPEECH_RMS = 2000
+# Silence kept around the speech when trimming, so word onsets are not clipped
+TRIM_PAD_MS = 200
+
+
+class Recording:
+    def __init__(self, samples, sample_rate):
+        # (frames,) for mono or (frames, channels); int16 in C order so it can be viewed as raw PCM
+        self.samples = np.ascontiguousarray(samples, dtype=np.int16)
+        self.sample_rate = sample_rate
+
+    @property
+    def channels(self):
+        return 1 if self.samples.ndim == 1 else self.samples.shape[1]
+
+    @property
+    def frames(self):
+        return self.samples.shape[0]
+
+    @property
+    def seconds(self):
+        return self.frames / self.sample_rate
+
+    def pcm(self):
+        """The samples as little-endian PCM bytes, without copying."""
+        return memoryview(self.samples).cast("B")
+
+    def audio_data(self):
+        """An sr.AudioData over this recording's buffer (mono only, as the recognizers expect)."""
+        if self.channels != 1:
+            raise ValueError(f"expected a mono recording, got {self.channels} channels")
+        return sr.AudioData(self.pcm(), self.sample_rate, SAMPLE_WIDTH)
+
+    def wav_bytes(self):
+        """The recording as a WAV file in memory, e.g. for st.audio."""
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as f:
+            f.setnchannels(self.channels)
+            f.setsampwidth(SAMPLE_WIDTH)
+            f.setframerate(self.sample_rate)
+            f.writeframes(self.pcm())
+        return buffer.getvalue()
+
+    @classmethod
+    def from_wav(cls, data):
+        """Parse 16-bit PCM WAV bytes (e.g. from st.audio_input) into a Recording."""
+        with wave.open(io.BytesIO(data), "rb") as f:
+            if f.getsampwidth() != SAMPLE_WIDTH:
+                raise ValueError(f"expected 16-bit PCM audio, got {8 * f.getsampwidth()}-bit")
+            channels = f.getnchannels()
+            sample_rate = f.getframerate()
+            raw = f.readframes(f.getnframes())
+        samples = np.frombuffer(raw, dtype="<i2")
+        if channels > 1:
+            samples = samples.reshape(-1, channels)
+        return cls(samples, sample_rate)
+
+
+# ------------------ Voice activity ------------------
+def frame_rms(samples, frame_len):
+    """RMS energy of every whole frame of `frame_len` samples (mono int16 input)."""
+    count = len(samples) // frame_len
+    frames = samples[: count * frame_len].reshape(count, frame_len).astype(np.float32)
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+
+def speech_threshold(noise_rms):
+    """RMS above which a frame counts as speech, given RMS values of background noise."""
+    noise = float(np.median(noise_rms)) if len(noise_rms) else 0.0
+    return min(max(noise * NOISE_FACTOR, MIN_SPEECH_RMS), MAX_SPEECH_RMS)
+
+
+def trim_silence(recording, threshold=None, frame_ms=FRAME_MS, pad_ms=TRIM_PAD_MS):
+    """The recording without leading/trailing silence (a view, no copy); empty if no speech was found."""
+    frame_len = int(recording.sample_rate * frame_ms / 1000)
+    rms = frame_rms(recording.samples, frame_len)
+    if threshold is None:
+        # The quietest fifth of the recording stands in for the noise floor
+        threshold = speech_threshold(np.sort(rms)[: max(len(rms) // 5, 1)])
+    voiced = np.flatnonzero(rms >= threshold)
+    if voiced.size == 0:
+        return Recording(recording.samples[:0], recording.sample_rate)
+    pad = pad_ms // frame_ms
+    start = max(voiced[0] - pad, 0) * frame_len
+    stop = min((voiced[-1] + 1 + pad) * frame_len, recording.frames)
+    return Recording(recording.samples[start:stop], recording.sample_rate)
+
+
+def record_until_silence(max_seconds=30.0, trailing_silence=1.2, start_timeout=8.0,
+                         sample_rate=DEFAULT_SAMPLE_RATE, frame_ms=FRAME_MS, threshold=None, on_audio=None):
+    """Record from the microphone until the speaker stops talking; returns the trimmed Recording.
+
+    Stops after `trailing_silence` seconds of silence following speech, after
+    `start_timeout` seconds if nobody speaks at all, and after `max_seconds`
+    in any case. Pass `threshold` (int16 RMS) to skip noise calibration.
+    `on_audio(samples)` is called with every batch of samples as it is read,
+    e.g. to feed a streaming recognizer.
+    """
+    import sounddevice as sd
+
+    frame_len = int(sample_rate * frame_ms / 1000)
+    trailing_frames = math.ceil(trailing_silence * 1000 / frame_ms)
+    max_samples = int(max_seconds * sample_rate)
+    start_samples = int(start_timeout * sample_rate)
+    blocks = queue.Queue()
+
+    def callback(indata, frames, time_info, status):
+        # PortAudio reuses `indata` after the callback returns
+        blocks.put(indata[:, 0].copy())
+
+    chunks = []
+    total = 0
+    calibration = []
+    speech_seen = False
+    silent_frames = 0
+    with sd.InputStream(samplerate=sample_rate, channels=1, dtype="int16", blocksize=frame_len, callback=callback):
+        while total < max_samples:
+            try:
+                batch = [blocks.get(timeout=1.0)]
+            except queue.Empty:
+                raise RuntimeError("no audio is arriving from the microphone")
+            # Take everything that has queued up, so the detector runs once per batch
+            while True:
+                try:
+                    batch.append(blocks.get_nowait())
+                except queue.Empty:
+                    break
+            samples = np.concatenate(batch)
+            chunks.append(samples)
+            total += len(samples)
+            if on_audio is not None:
+                on_audio(samples)
+            rms = frame_rms(samples, frame_len)
+
+            if threshold is None:
+                calibration.extend(rms.tolist())
+                if len(calibration) < CALIBRATION_FRAMES:
+                    continue
+                threshold = speech_threshold(np.array(calibration[:CALIBRATION_FRAMES]))
+                rms = rms[max(len(rms) - (len(calibration) - CALIBRATION_FRAMES), 0):]
+
+            voiced = np.flatnonzero(rms >= threshold)
+            if voiced.size:
+                speech_seen = True
+                silent_frames = len(rms) - 1 - voiced[-1]
+            else:
+                silent_frames += len(rms)
+
+            if speech_seen and silent_frames >= trailing_frames:
+                break
+            if not speech_seen and total >= start_samples:
+                break
+
+    samples = np.concatenate(chunks)[:max_samples] if chunks else np.zeros(0, dtype=np.int16)
+    return trim_silence(Recording(samples, sample_rate), threshold, frame_ms)
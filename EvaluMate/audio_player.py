@@ -0,0 +1,43 @@
+'''
+Play audio in the browser while the rest of it is still being synthesized.
+
+    segments = play_segments(tts_cache.stream(question))
+
+Each segment is sent to the page as soon as the server has it, as a tiny
+invisible component. All segments of one stream go into one playback queue
+on the Streamlit page, so they play back to back: the first sentence starts
+while later ones are still being rendered. `st.audio` cannot do this, because
+it needs the whole clip up front and each element plays on its own.
+'''
+import base64
+import json
+import uuid
+
+import streamlit.components.v1 as components
+
+_SEGMENT_HTML = """
+<audio id="segment" src="data:{format};base64,{data}" preload="auto"></audio>
+<script>
+  // Queue on the Streamlit page (all components share its origin) so segments play in order
+  let host = window;
+  try {{ host = window.parent; host.document; }} catch (e) {{ host = window; }}
+  const queues = host.__evalumateAudio = host.__evalumateAudio || {{}};
+  const audio = document.getElementById("segment");
+  queues[{stream}] = (queues[{stream}] || Promise.resolve()).then(() => new Promise((done) => {{
+    audio.onended = done;
+    audio.onerror = done;
+    audio.play().catch(done);
+  }}));
+</script>
+"""
+
+
+def play_segments(segments, stream_id=None):
+    """Render each Speech segment as it arrives, queued for gapless playback; returns the segments."""
+    stream = json.dumps(stream_id or uuid.uuid4().hex)
+    played = []
+    for segment in segments:
+        data = base64.b64encode(segment.data).decode("ascii")
+        components.html(_SEGMENT_HTML.format(format=segment.format, data=data, stream=stream), height=0)
+        played.append(segment)
+    return played
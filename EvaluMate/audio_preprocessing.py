@@ -0,0 +1,139 @@
+'''
+Audio preprocessing between capture and speech recognition.
+
+    clean = preprocess(recording, target_rate=16000)
+
+Each step works on the whole numpy buffer at once:
+
+1. mix to mono
+2. remove the DC offset
+3. resample to the recognizer's native rate with a polyphase filter
+   (scipy.signal.resample_poly; linear interpolation without scipy)
+4. normalize the gain so the peak sits at TARGET_PEAK_DBFS, never amplifying
+   by more than MAX_GAIN_DB
+5. trim leading and trailing silence
+
+A 44.1 kHz answer shrinks to about a third of its size before upload, and the
+recognizer gets a consistent level. `encode_flac()` compresses a recording
+further for storage or transmission.
+
+Run this file directly for a throughput benchmark on a batch of recordings.
+'''
+import math
+
+import numpy as np
+
+try:
+    from scipy.signal import resample_poly
+except ImportError:  # not in requirements.txt; fall back to numpy interpolation
+    resample_poly = None
+
+from audio_capture import Recording, trim_silence
+
+RECOGNIZER_SAMPLE_RATE = 16000
+TARGET_PEAK_DBFS = -3.0
+MAX_GAIN_DB = 20.0
+
+
+def to_mono(samples):
+    """float32 mono signal from int16 samples shaped (frames,) or (frames, channels)."""
+    x = samples.astype(np.float32)
+    return x if x.ndim == 1 else x.mean(axis=1)
+
+
+def remove_dc(x):
+    if len(x):
+        x -= x.mean()
+    return x
+
+
+def resample(x, from_rate, to_rate):
+    if from_rate == to_rate:
+        return x
+    if resample_poly is None:
+        # No anti-aliasing filter, but speech recognizers cope with the small amount it lets through
+        frames = int(round(len(x) * to_rate / from_rate))
+        positions = np.arange(frames, dtype=np.float64) * (from_rate / to_rate)
+        return np.interp(positions, np.arange(len(x)), x).astype(np.float32, copy=False)
+    divisor = math.gcd(from_rate, to_rate)
+    return resample_poly(x, to_rate // divisor, from_rate // divisor).astype(np.float32, copy=False)
+
+
+def normalize_gain(x, target_dbfs=TARGET_PEAK_DBFS, max_gain_db=MAX_GAIN_DB):
+    peak = float(np.max(np.abs(x))) if len(x) else 0.0
+    if peak == 0.0:
+        return x
+    gain = min(32767 * 10 ** (target_dbfs / 20) / peak, 10 ** (max_gain_db / 20))
+    x *= gain
+    return x
+
+
+def to_int16(x):
+    return np.clip(np.rint(x), -32768, 32767).astype(np.int16)
+
+
+def preprocess(recording, target_rate=RECOGNIZER_SAMPLE_RATE, trim=True):
+    """Mono, DC-free, resampled, level-normalized (and trimmed) copy of `recording`."""
+    x = to_mono(recording.samples)
+    x = remove_dc(x)
+    x = resample(x, recording.sample_rate, target_rate)
+    x = normalize_gain(x)
+    clean = Recording(to_int16(x), target_rate)
+    return trim_silence(clean) if trim else clean
+
+
+def encode_flac(recording):
+    """FLAC bytes for a mono recording (uses the flac encoder bundled with SpeechRecognition)."""
+    return recording.audio_data().get_flac_data()
+
+
+if __name__ == "__main__":
+    import time
+
+    BATCH = 32
+    SECONDS = 10
+    RATE = 44100
+    rng = np.random.default_rng(0)
+
+    def fake_answer():
+        # 1 s of room noise, then "speech" (noise-modulated tones with an offset), then 1 s of noise
+        t = np.arange(int((SECONDS - 2) * RATE)) / RATE
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+        speech = 4000 * envelope * (np.sin(2 * np.pi * 220 * t) + 0.3 * rng.standard_normal(len(t)))
+        noise = lambda: 80 * rng.standard_normal(RATE)
+        mono = np.concatenate([noise(), speech, noise()]) + 500
+        stereo = np.stack([mono, 0.8 * mono], axis=1)
+        return Recording(np.clip(stereo, -32768, 32767).astype(np.int16), RATE)
+
+    recordings = [fake_answer() for _ in range(BATCH)]
+    audio_seconds = sum(r.seconds for r in recordings)
+    raw_bytes = sum(r.samples.nbytes for r in recordings)
+
+    started = time.perf_counter()
+    cleaned = [preprocess(r) for r in recordings]
+    elapsed = time.perf_counter() - started
+    clean_bytes = sum(r.samples.nbytes for r in cleaned)
+
+    print(f"{BATCH} recordings, {audio_seconds:.0f} s of {RATE} Hz stereo audio")
+    print(f"preprocess: {elapsed * 1e3:8.1f} ms total, {elapsed / BATCH * 1e3:6.2f} ms/recording, "
+          f"{audio_seconds / elapsed:8.0f}x real time")
+    print(f"payload:    {raw_bytes / 1e6:8.2f} MB raw -> {clean_bytes / 1e6:.2f} MB as 16 kHz mono, trimmed "
+          f"({clean_bytes / raw_bytes:.0%})")
+
+    for name, step in (
+        ("to_mono", lambda r: to_mono(r.samples)),
+        ("resample", lambda r: resample(to_mono(r.samples), RATE, RECOGNIZER_SAMPLE_RATE)),
+    ):
+        started = time.perf_counter()
+        for r in recordings:
+            step(r)
+        print(f"  {name:<9} {(time.perf_counter() - started) / BATCH * 1e3:6.2f} ms/recording (cumulative)")
+
+    try:
+        started = time.perf_counter()
+        flac_bytes = sum(len(encode_flac(r)) for r in cleaned)
+        elapsed = time.perf_counter() - started
+        print(f"flac:       {elapsed / BATCH * 1e3:6.2f} ms/recording, {flac_bytes / 1e6:.2f} MB "
+              f"({flac_bytes / raw_bytes:.0%} of raw)")
+    except (ImportError, OSError) as e:
+        print(f"flac:       skipped ({e})")
@@ -0,0 +1,223 @@
+'''
+Token-aware chunking of page-indexed documents.
+
+Text is split on page boundaries first, then paragraphs, then sentences, and
+only cut mid-sentence when a single sentence is larger than the budget. The
+pieces are packed greedily into chunks that fit a per-model token budget.
+Chunks are `TextView`s into the document, so they know their page numbers and
+cost nothing until their text is needed.
+
+Token counts use tiktoken when it is installed. Groq/Ollama models do not ship
+a tiktoken encoding, so they are counted with cl100k_base, which is close
+enough for budgeting. Chunk offsets are memoized per (document hash, budget,
+encoding); the memo holds no reference to the Document itself, so a book
+evicted from the PDF cache can be freed.
+'''
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from document import TextView
+
+try:
+    import tiktoken
+except ImportError:  # fall back to the ~4 characters per token rule of thumb
+    tiktoken = None
+
+# Context window, in tokens, of the models used across this repo
+MODEL_CONTEXT_TOKENS = {
+    "llama3-70b-8192": 8192,
+    "gemma2-9b-it": 8192,
+    "meta-llama/llama-guard-4-12b": 8192,
+    "gpt-4o-mini": 128000,
+    "o4-mini": 200000,
+    "qwen2.5:0.5b": 2048,  # Ollama's default num_ctx, whatever the model supports
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+# Book text embedded in a prompt that is resent every turn; the context window is a ceiling, not a target
+DEFAULT_BOOK_TOKENS = int(os.getenv("EVALUMATE_BOOK_TOKENS", "3000"))
+FALLBACK_ENCODING = "cl100k_base"
+CHARS_PER_TOKEN = 4
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+
+
+def context_budget(model_name, reserve=1024):
+    """Tokens available for document text once `reserve` tokens are kept for instructions and the reply."""
+    context = MODEL_CONTEXT_TOKENS.get(model_name, DEFAULT_CONTEXT_TOKENS)
+    return max(context - reserve, 256)
+
+
+def book_budget(model_name, max_tokens=None, reserve=1024):
+    """Tokens of book text for a prompt: `max_tokens` (default EVALUMATE_BOOK_TOKENS), capped by context_budget."""
+    max_tokens = DEFAULT_BOOK_TOKENS if max_tokens is None else max_tokens
+    return min(max_tokens, context_budget(model_name, reserve))
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model_name=None):
+    """tiktoken encoding for a model (loaded once per process), or None without tiktoken."""
+    if tiktoken is None:
+        return None
+    if model_name:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            pass
+    return tiktoken.get_encoding(FALLBACK_ENCODING)
+
+
+def count_tokens(text, model_name=None):
+    encoding = get_encoding(model_name)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class Chunk(TextView):
+    def __init__(self, document, start, stop, tokens):
+        super().__init__(document, start, stop)
+        self.tokens = tokens
+
+    def __repr__(self):
+        return f"Chunk({self.start}, {self.stop}, tokens={self.tokens}, pages={self.page_numbers})"
+
+
+def _split(text, start, stop, pattern):
+    """Split text[start:stop] on `pattern`, returning (start, stop) spans of the non-empty pieces."""
+    spans = []
+    piece_start = start
+    for match in pattern.finditer(text, start, stop):
+        if match.start() > piece_start:
+            spans.append((piece_start, match.start()))
+        piece_start = match.end()
+    if stop > piece_start:
+        spans.append((piece_start, stop))
+    return spans
+
+
+def _hard_split(text, start, stop, max_tokens, model_name):
+    """Cut a span that has no usable boundaries into pieces of at most max_tokens."""
+    encoding = get_encoding(model_name)
+    if encoding is None:
+        step = max_tokens * CHARS_PER_TOKEN
+        return [(s, min(s + step, stop)) for s in range(start, stop, step)]
+    tokens = encoding.encode(text[start:stop], disallowed_special=())
+    _, offsets = encoding.decode_with_offsets(tokens)
+    cuts = [start + offsets[i] for i in range(0, len(tokens), max_tokens)] + [stop]
+    return [(a, b) for a, b in zip(cuts, cuts[1:]) if b > a]
+
+
+def _segments(document, max_tokens, model_name):
+    """Yield (start, stop, tokens) pieces that each fit max_tokens, in document order."""
+    text = document.text
+    for number in document.page_numbers:
+        page_start, page_stop = document.page_span(number)
+        # Stack of spans still to place, next span on top; level 0 = page, 1 = paragraph, 2 = sentence
+        pending = [(page_start, page_stop, 0)]
+        while pending:
+            start, stop, level = pending.pop()
+            tokens = count_tokens(text[start:stop], model_name)
+            if tokens <= max_tokens:
+                yield start, stop, tokens
+            elif level < 2:
+                pattern = _PARAGRAPH_BREAK if level == 0 else _SENTENCE_BREAK
+                pending.extend((a, b, level + 1) for a, b in reversed(_split(text, start, stop, pattern)))
+            else:
+                for a, b in _hard_split(text, start, stop, max_tokens, model_name):
+                    yield a, b, count_tokens(text[a:b], model_name)
+
+
+def _pack(document, max_tokens, model_name):
+    """(start, stop, tokens) of each chunk, in document order."""
+    text = document.text
+    chunks = []
+    chunk_start = chunk_stop = None
+    chunk_tokens = 0
+    for start, stop, tokens in _segments(document, max_tokens, model_name):
+        if chunk_start is not None:
+            gap = count_tokens(text[chunk_stop:start], model_name)
+            if chunk_tokens + gap + tokens <= max_tokens:
+                chunk_stop = stop
+                chunk_tokens += gap + tokens
+                continue
+            chunks.append((chunk_start, chunk_stop, chunk_tokens))
+        chunk_start, chunk_stop, chunk_tokens = start, stop, tokens
+    if chunk_start is not None:
+        chunks.append((chunk_start, chunk_stop, chunk_tokens))
+    return chunks
+
+
+class LRUCache:
+    """Thread-safe memo of built values, least recently used evicted first.
+
+    Holds at most `max_entries` values and, if `max_bytes` is given, at most
+    that many bytes as estimated by `sizeof(value)`. Keyed by whatever
+    identifies the input, e.g. (document hash, budget, encoding). Values should
+    not keep a Document alive, or they defeat the PDF cache's memory budget.
+    Also holds retrieval.py's passage indexes.
+    """
+
+    def __init__(self, max_entries=64, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        """The value cached for `key`, or `build()` stored under it.
+
+        `build` runs outside the lock, so two threads missing the same key at
+        once may both build it; the last one stored wins.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+        value = build()
+        size = self.sizeof(value) if self.sizeof else 0
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            # Always keep the newest entry, even if it alone is over budget
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes is not None and self.current_bytes > self.max_bytes)
+            ):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+        return value
+
+
+_chunk_cache = LRUCache()
+
+
+def _chunk_spans(document, max_tokens, model_name):
+    encoding = get_encoding(model_name)
+    key = (document.doc_id, max_tokens, encoding.name if encoding else None)
+    return _chunk_cache.get_or_build(key, lambda: _pack(document, max_tokens, model_name))
+
+
+def chunk_document(document, max_tokens, model_name=None):
+    """Split a Document into Chunks of at most max_tokens (computed once per document and budget)."""
+    spans = _chunk_spans(document, max_tokens, model_name)
+    return [Chunk(document, start, stop, tokens) for start, stop, tokens in spans]
+
+
+def document_tokens(document, model_name=None):
+    """Approximate token count of the whole document (sum of its chunks at the model's budget)."""
+    return sum(tokens for _, _, tokens in _chunk_spans(document, context_budget(model_name), model_name))
+
+
+def leading_text(document, max_tokens, model_name=None):
+    """The start of the document, cut at a natural boundary so it fits max_tokens."""
+    chunks = chunk_document(document, max_tokens, model_name)
+    return str(chunks[0]) if chunks else ""
@@ -0,0 +1,111 @@
+'''
+Token-budgeted conversation memory for the viva chat loops.
+
+The system prompt (with the embedded PDF) is always sent. The last
+`keep_last_turns` question/answer turns are sent verbatim. Older turns are
+folded into a running summary that the model updates incrementally from the
+previous summary plus the turns being dropped. The history sent on each turn
+therefore stays around `history_tokens` however long the viva runs, instead of
+growing with every message.
+
+Folding is batched: it waits until `fold_turns` turns have left the verbatim
+window (or the history is over budget), so the summarizer is called once
+every few turns rather than on every one. The call runs on a background
+thread and never delays a reply. Until it finishes, the turns being folded are
+still sent verbatim.
+'''
+import contextvars
+import threading
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from chunking import count_tokens
+
+SUMMARY_PROMPT = """Progressively summarize this viva conversation, adding to the previous summary and returning a new summary.
+Keep every question that was asked, whether the student's answer was correct, and any mistakes or gaps the examiner pointed out. Be concise.
+
+Previous summary:
+{summary}
+
+New lines of conversation:
+{new_lines}
+
+New summary:"""
+
+
+class ConversationMemory:
+    def __init__(self, system_message, summarizer, history_tokens=2000, keep_last_turns=3, fold_turns=3,
+                 model_name=None):
+        self.system_message = system_message
+        self.summarizer = summarizer
+        self.history_tokens = history_tokens
+        self.keep_last_turns = keep_last_turns
+        self.fold_turns = fold_turns
+        self.model_name = model_name
+        self.summary = ""
+        self.recent = []  # HumanMessage/AIMessage, oldest first
+        self._lock = threading.Lock()
+        self._folding = None  # thread summarizing the oldest turns, if any
+
+    def add_user(self, text):
+        with self._lock:
+            self.recent.append(HumanMessage(content=text))
+
+    def add_ai(self, text):
+        """Record the model's reply; this completes a turn, so older turns may be folded now (in the background)."""
+        with self._lock:
+            self.recent.append(AIMessage(content=text))
+            self._compact()
+
+    def messages(self):
+        """What to send to the model: system prompt, running summary, recent turns."""
+        with self._lock:
+            messages = [self.system_message]
+            if self.summary:
+                messages.append(SystemMessage(content=f"Summary of the viva so far:\n{self.summary}"))
+            return messages + self.recent
+
+    def wait(self):
+        """Block until a fold in progress has finished, e.g. before saving the summary."""
+        folding = self._folding
+        if folding is not None:
+            folding.join()
+
+    def _compact(self):
+        # Called with the lock held; one fold at a time, the next turn retries
+        if self._folding is not None:
+            return
+        # Fold whole turns (student + examiner message) beyond the verbatim window,
+        # then more of the oldest turns while the history is still over budget
+        sizes = [count_tokens(message.content, self.model_name) for message in self.recent]
+        budget = self.history_tokens - count_tokens(self.summary, self.model_name)
+        overflow = max(len(self.recent) - 2 * self.keep_last_turns, 0)
+        overflow -= overflow % 2
+        fold = overflow
+        while len(self.recent) - fold > 2 and sum(sizes[fold:]) > budget:
+            fold += 2
+        if fold == 0 or (fold == overflow and overflow < 2 * self.fold_turns):
+            return
+
+        old = self.recent[:fold]
+        new_lines = "\n".join(
+            f"{'Student' if isinstance(message, HumanMessage) else 'Examiner'}: {message.content}" for message in old
+        )
+        prompt = SUMMARY_PROMPT.format(summary=self.summary or "(none yet)", new_lines=new_lines)
+        # Run in a copy of the caller's context so the summarizer call is traced with the turn that caused it
+        context = contextvars.copy_context()
+        self._folding = threading.Thread(target=context.run, args=(self._fold, prompt, fold), daemon=True)
+        self._folding.start()
+
+    def _fold(self, prompt, fold):
+        try:
+            summary = self.summarizer.invoke(prompt).content.strip()
+        except Exception:
+            # Keep the turns verbatim; the next completed turn tries again
+            summary = None
+        with self._lock:
+            if summary is not None:
+                # Only appends happen meanwhile, so the folded turns are still the oldest
+                self.summary = summary
+                del self.recent[:fold]
+            self._folding = None
@@ -0,0 +1,137 @@
+'''
+Page-indexed document text.
+
+The whole book is stored once as a single string, built with one join, plus an
+array of page start/end offsets into it. Pages and character ranges are sliced
+straight out of that buffer, and `TextView` objects describe a range without
+copying it until the text is actually needed. Page numbers are the PDF's own
+(starting at 1), so they stay correct when empty pages are skipped.
+'''
+import hashlib
+from array import array
+from bisect import bisect_right
+
+
+class TextView:
+    """A lazy [start, stop) range of a Document; the text is only sliced out by str()."""
+
+    def __init__(self, document, start, stop):
+        self.document = document
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __str__(self):
+        return self.document.text[self.start:self.stop]
+
+    def view(self, start=0, stop=None):
+        """Sub-range relative to this view."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        return TextView(self.document, self.start + start, self.start + stop)
+
+    def truncate(self, max_chars):
+        return self.view(0, max_chars)
+
+    @property
+    def page_numbers(self):
+        """Page numbers this view overlaps."""
+        return self.document.pages_between(self.start, self.stop)
+
+    def __repr__(self):
+        return f"TextView({self.start}, {self.stop}, pages={self.page_numbers})"
+
+
+class Document:
+    def __init__(self, text, page_numbers, starts, ends, doc_id=None):
+        self.text = text
+        self.page_numbers = page_numbers
+        self._starts = starts
+        self._ends = ends
+        self._index = {number: i for i, number in enumerate(page_numbers)}
+        self._doc_id = doc_id
+
+    @classmethod
+    def from_pages(cls, pages, separator="", strip=False, skip_empty=False, doc_id=None):
+        """Build a document from page texts in order (page 1 first).
+
+        With `strip=True, skip_empty=True, separator="\\n\\n"` the text is the same as
+        the EvaluMate scripts' `"\\n\\n".join(pdf_text_dict.values())`.
+        """
+        texts = []
+        page_numbers = []
+        for number, page_text in enumerate(pages, start=1):
+            if strip:
+                page_text = page_text.strip()
+            if skip_empty and not page_text:
+                continue
+            texts.append(page_text)
+            page_numbers.append(number)
+
+        starts = array("q")
+        ends = array("q")
+        offset = 0
+        for page_text in texts:
+            starts.append(offset)
+            offset += len(page_text)
+            ends.append(offset)
+            offset += len(separator)
+        return cls(separator.join(texts), page_numbers, starts, ends, doc_id=doc_id)
+
+    @property
+    def doc_id(self):
+        """Stable identifier: the PDF's content hash if known, else a hash of the text."""
+        if self._doc_id is None:
+            self._doc_id = hashlib.sha256(self.text.encode("utf-8")).hexdigest()
+        return self._doc_id
+
+    def __len__(self):
+        return len(self.text)
+
+    def __bool__(self):
+        return bool(self.page_numbers)
+
+    @property
+    def page_count(self):
+        return len(self.page_numbers)
+
+    def page_span(self, number):
+        """(start, stop) character offsets of a page."""
+        i = self._index[number]
+        return self._starts[i], self._ends[i]
+
+    def page(self, number):
+        start, stop = self.page_span(number)
+        return self.text[start:stop]
+
+    def items(self):
+        """Iterate over (page_number, text) pairs."""
+        for number in self.page_numbers:
+            yield number, self.page(number)
+
+    def page_at(self, offset):
+        """Page number containing a character offset (separators belong to the page before)."""
+        i = max(bisect_right(self._starts, offset) - 1, 0)
+        return self.page_numbers[i]
+
+    def pages_between(self, start, stop):
+        """Page numbers overlapping the character range [start, stop)."""
+        if stop <= start or not self.page_numbers:
+            return []
+        first = max(bisect_right(self._starts, start) - 1, 0)
+        last = max(bisect_right(self._starts, stop - 1) - 1, 0)
+        return self.page_numbers[first:last + 1]
+
+    def view(self, start=0, stop=None):
+        stop = len(self.text) if stop is None else min(stop, len(self.text))
+        return TextView(self, start, stop)
+
+    def pages_view(self, first, last=None):
+        """View covering pages first..last (inclusive)."""
+        start = self.page_span(first)[0]
+        stop = self.page_span(first if last is None else last)[1]
+        return TextView(self, start, stop)
+
+    def truncate(self, max_chars):
+        return self.view(0, max_chars)
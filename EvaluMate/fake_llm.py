@@ -0,0 +1,219 @@
+'''
+Offline stand-in for the chat models, for benchmarks and offline runs.
+
+FakeChatModel is a LangChain chat model, so invoke/stream/batch and their
+async versions all work wherever ChatGroq, ChatOpenAI or ChatOllama is used.
+Each reply comes from, in order:
+
+1. A cassette: a JSON file of recorded request -> reply pairs, keyed by a hash
+   of the messages.
+2. The wrapped real model (record mode). Its reply is saved to the cassette.
+3. Synthesis from the prompt: the Easy/Moderate/Difficult "Q1:/A1:" layout,
+   the JSON question layout, a bare 0-10 score, a JSON array of scores, etc.
+   Output is deterministic for a given prompt.
+
+Replies are paced by `latency` (seconds before the first token) and
+`tokens_per_second`, so streaming and concurrency behave roughly like a hosted
+model.
+
+Apps get it through `models.chat_model` when EVALUMATE_FAKE_LLM is set; see
+models.py for the settings.
+'''
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+_TOKEN = re.compile(r"\s*\S+")
+_WORD = re.compile(r"[A-Za-z][A-Za-z-]{3,}")
+_STOPWORDS = {
+    "that", "this", "with", "from", "have", "were", "which", "their", "there", "these", "those", "what",
+    "when", "where", "will", "would", "about", "into", "than", "then", "them", "they", "been", "being",
+    "each", "some", "such", "only", "also", "more", "most", "other", "over", "your", "here",
+}
+_CONTENT = re.compile(r"---\s*(?:CONTENT|START OF PDF CONTENT)[^\n]*\n(.*?)\n---", re.DOTALL)
+
+
+def cassette_key(messages):
+    raw = json.dumps([[message.type, message.content] for message in messages])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """Recorded replies in a JSON file: {key: {"request": [...], "response": "..."}}."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._entries = json.load(f)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        return None if entry is None else entry["response"]
+
+    def put(self, key, messages, response):
+        with self._lock:
+            self._entries[key] = {
+                "request": [[message.type, message.content] for message in messages],
+                "response": response,
+            }
+            if self.path:
+                tmp = self.path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self._entries, f, indent=1)
+                os.replace(tmp, self.path)
+
+
+# ------------------ Synthesized replies ------------------
+def _topics(prompt, rng):
+    match = _CONTENT.search(prompt)
+    words = [w.lower() for w in _WORD.findall(match.group(1) if match else prompt)]
+    topics = sorted({w for w in words if w not in _STOPWORDS})
+    if not topics:
+        topics = ["the main idea", "the definition", "the example", "the method", "the result"]
+    rng.shuffle(topics)
+    return topics
+
+
+def _qa_lines(prompt, rng):
+    topics = _topics(prompt, rng)
+    counts = {}
+    for level in ("Easy", "Moderate", "Difficult"):
+        match = re.search(r"-\s*(\d+)\s+" + level, prompt)
+        counts[level] = int(match.group(1)) if match else 5
+    lines = []
+    number = 1
+    for level, count in counts.items():
+        lines.append(f"{level}:")
+        for _ in range(count):
+            topic = topics[number % len(topics)]
+            lines.append(f"Q{number}: ({level}) What does the text say about {topic}?")
+            lines.append(f"A{number}: The text explains {topic} and how it relates to {topics[(number + 1) % len(topics)]}.")
+            number += 1
+        lines.append("")
+    return "\n".join(lines)
+
+
+def _qa_json(prompt, rng):
+    topics = _topics(prompt, rng)
+    bank = {}
+    for i, level in enumerate(("easy", "moderate", "difficult")):
+        bank[level] = [
+            {
+                "question": f"({level}) What does the text say about {topics[(5 * i + j) % len(topics)]}?",
+                "answer": f"The text explains {topics[(5 * i + j) % len(topics)]}.",
+            }
+            for j in range(5)
+        ]
+    return json.dumps(bank, indent=1)
+
+
+def synthesize(prompt):
+    """A plausible reply in whatever format the prompt asks for."""
+    rng = random.Random(int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16], 16))
+    lowered = prompt.lower()
+    if "json array of" in lowered:
+        match = re.search(r"json array of (\d+)", lowered)
+        return json.dumps([rng.randint(0, 10) for _ in range(int(match.group(1)))])
+    if "score out of 10" in lowered and "just reply with a number" in lowered:
+        return str(rng.randint(0, 10))
+    if '"feedback"' in lowered and '"score"' in lowered:
+        return json.dumps({"feedback": "Partly correct; the answer misses a key detail from the text.", "score": rng.randint(0, 10)})
+    if '"easy"' in lowered and '"question"' in lowered:
+        return _qa_json(prompt, rng)
+    if re.search(r"-\s*\d+\s+easy", lowered):
+        return _qa_lines(prompt, rng)
+    if "progressively summarize" in lowered:
+        return "The examiner asked about several topics from the text; the student answered some of them correctly."
+    if "assess if the answer is correct" in lowered:
+        verdict = rng.choice(["Correct", "Incorrect"])
+        level = rng.choice(["easy", "medium", "hard"])
+        return f"{verdict}\nThe answer covers part of the topic.\nNext difficulty: {level}\nNone"
+    if "generate one question" in lowered:
+        return f"What does the text say about {_topics(prompt, rng)[0]}?"
+    topic = _topics(prompt, rng)[0]
+    return f"Thank you. Next question: can you explain what the text says about {topic}?"
+
+
+# ------------------ Model ------------------
+class FakeChatModel(BaseChatModel):
+    model_name: str = "fake"
+    latency: float = 0.3
+    tokens_per_second: float = 200.0
+    cassette_path: Optional[str] = None
+    # Real model called on cassette misses (record mode); its replies are saved to the cassette
+    inner: Optional[Any] = None
+    replay_only: bool = False
+
+    _cassette: Any = PrivateAttr(default=None)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._cassette = Cassette(self.cassette_path)
+
+    @property
+    def _llm_type(self):
+        return "evalumate-fake"
+
+    @property
+    def _identifying_params(self):
+        return {"model_name": self.model_name}
+
+    def _reply(self, messages):
+        key = cassette_key(messages)
+        reply = self._cassette.get(key)
+        if reply is not None:
+            return reply
+        if self.replay_only:
+            raise KeyError(f"no recorded reply for request {key[:12]} in {self.cassette_path}")
+        if self.inner is not None:
+            reply = self.inner.invoke(messages).content
+            self._cassette.put(key, messages, reply)
+            return reply
+        return synthesize("\n".join(str(message.content) for message in messages))
+
+    def _pieces(self, text):
+        return _TOKEN.findall(text) or [text]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self._reply(messages)
+        time.sleep(self.latency + len(self._pieces(text)) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = await asyncio.to_thread(self._reply, messages) if self.inner is not None else self._reply(messages)
+        await asyncio.sleep(self.latency + len(self._pieces(text)) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self._reply(messages)
+        time.sleep(self.latency)
+        for piece in self._pieces(text):
+            time.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        text = await asyncio.to_thread(self._reply, messages) if self.inner is not None else self._reply(messages)
+        await asyncio.sleep(self.latency)
+        for piece in self._pieces(text):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
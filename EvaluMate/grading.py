@@ -0,0 +1,226 @@
+'''
+Answer grading, one at a time or in bulk.
+
+`agrade_answers` takes many (question, correct answer, student answer) triples.
+Short answers from the same session are packed several to a prompt, and the
+model replies with a JSON array of scores. Answers from different sessions
+(`sessions=`) never share a prompt, so one student's text cannot sway another
+student's score. Packs whose reply cannot be read, and items too long to pack,
+are graded one by one. All prompts go through `abatch` with bounded
+concurrency. Results come back in input order as GradeResult(score, error):
+one bad reply or failed request only affects its own item instead of turning
+into a 0.
+
+Pass a GradingCache to skip anything graded before: only cache misses are sent
+to the model, and new scores are stored.
+'''
+import asyncio
+import hashlib
+import json
+import re
+from collections import namedtuple
+
+from chunking import count_tokens
+from tracing import span
+
+GradeResult = namedtuple("GradeResult", ["score", "error"])
+
+# Items are only packed together while the pack's text stays under this many tokens
+PACK_TOKEN_LIMIT = 1500
+DEFAULT_PACK_SIZE = 5
+
+GRADE_PROMPT = """
+You are a strict examiner. Here is the question, the correct answer, and a student's answer.
+
+Question: {question}
+
+Correct Answer: {correct_answer}
+
+Student's Answer: {user_answer}
+
+Evaluate the student's answer strictly and give a score out of 10. Just reply with a number between 0 and 10. No explanation, no extra words.
+"""
+
+PACKED_PROMPT = """
+You are a strict examiner. Below are {count} items, each with a question, the correct answer, and a student's answer.
+
+{items}
+
+Evaluate each student's answer strictly and independently and give it a score out of 10.
+Reply with only a JSON array of {count} integers between 0 and 10, one per item, in the same order. No explanation, no extra words.
+"""
+
+PACKED_ITEM = """Item {number}:
+Question: {question}
+Correct Answer: {correct_answer}
+Student's Answer: {user_answer}
+"""
+
+# Cached scores are only reused while the grading prompts stay the same
+PROMPT_VERSION = hashlib.sha256((GRADE_PROMPT + PACKED_PROMPT + PACKED_ITEM).encode("utf-8")).hexdigest()[:16]
+
+
+def model_id(llm):
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+
+
+# "7", "Score: 7", "**7**", "7/10"; a number followed by "/10" wins over an earlier bare one
+_SCORE = re.compile(r"\b(10|\d)\b(\s*/\s*10)?")
+
+
+def _check_score(score):
+    if isinstance(score, bool) or not isinstance(score, int) or not 0 <= score <= 10:
+        raise ValueError(f"score out of range: {score!r}")
+    return score
+
+
+def parse_score(text):
+    """The 0-10 score in a reply: the first "N/10" if there is one, else the first number 0-10."""
+    matches = list(_SCORE.finditer(text))
+    if not matches:
+        raise ValueError(f"no score in reply: {text.strip()[:80]!r}")
+    match = next((m for m in matches if m.group(2)), matches[0])
+    return _check_score(int(match.group(1)))
+
+
+def parse_scores(text, count):
+    match = re.search(r"\[.*?\]", text, re.DOTALL)
+    if match is None:
+        raise ValueError("no JSON array in reply")
+    scores = json.loads(match.group())
+    if len(scores) != count:
+        raise ValueError(f"expected {count} scores, got {len(scores)}")
+    return [_check_score(score) for score in scores]
+
+
+def build_prompt(question, correct_answer, user_answer):
+    return GRADE_PROMPT.format(question=question, correct_answer=correct_answer, user_answer=user_answer)
+
+
+def build_packed_prompt(items):
+    body = "\n".join(
+        PACKED_ITEM.format(number=i, question=q, correct_answer=a, user_answer=u)
+        for i, (q, a, u) in enumerate(items, start=1)
+    )
+    return PACKED_PROMPT.format(count=len(items), items=body)
+
+
+def _packs(items, pack_size, sessions=None):
+    """Group item indices into packs of short items from one session; long items get a pack of their own."""
+    by_session = {}
+    for i in range(len(items)):
+        by_session.setdefault(None if sessions is None else sessions[i], []).append(i)
+
+    packs = []
+    for indices in by_session.values():
+        current = []
+        current_tokens = 0
+        for i in indices:
+            tokens = count_tokens("\n".join(items[i]))
+            if current and (len(current) >= pack_size or current_tokens + tokens > PACK_TOKEN_LIMIT):
+                packs.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            packs.append(current)
+    return packs
+
+
+async def _agrade_answers(llm, items, pack_size, max_concurrency, cache, sessions, trace):
+    results = [None] * len(items)
+    config = {"max_concurrency": max_concurrency}
+
+    keys = [None] * len(items)
+    todo = list(range(len(items)))
+    if cache is not None:
+        model_name = model_id(llm)
+        keys = [cache.key(model_name, PROMPT_VERSION, *item) for item in items]
+        todo = []
+        for i, key in enumerate(keys):
+            score = cache.get(key)
+            if score is None:
+                todo.append(i)
+            else:
+                results[i] = GradeResult(score, None)
+
+    pending = [items[i] for i in todo]
+    pending_sessions = None if sessions is None else [sessions[i] for i in todo]
+    packs = [
+        [todo[j] for j in pack] for pack in _packs(pending, pack_size, pending_sessions) if len(pack) > 1
+    ] if pack_size > 1 else []
+    singles = sorted(set(todo) - {i for pack in packs for i in pack})
+
+    trace.set(cache_hits=len(items) - len(todo), packs=len(packs))
+    if packs:
+        prompts = [build_packed_prompt([items[i] for i in pack]) for pack in packs]
+        replies = await llm.abatch(prompts, config=config, return_exceptions=True)
+        for pack, reply in zip(packs, replies):
+            try:
+                if isinstance(reply, Exception):
+                    raise reply
+                for i, score in zip(pack, parse_scores(reply.content, len(pack))):
+                    results[i] = GradeResult(score, None)
+            except Exception:
+                # Grade this pack's items one by one instead
+                singles.extend(pack)
+
+    trace.set(singles=len(singles))
+    if singles:
+        prompts = [build_prompt(*items[i]) for i in singles]
+        replies = await llm.abatch(prompts, config=config, return_exceptions=True)
+        for i, reply in zip(singles, replies):
+            if isinstance(reply, Exception):
+                results[i] = GradeResult(None, reply)
+                continue
+            try:
+                results[i] = GradeResult(parse_score(reply.content), None)
+            except ValueError as e:
+                results[i] = GradeResult(None, e)
+
+    if cache is not None:
+        for i in todo:
+            if results[i].error is None:
+                cache.put(keys[i], results[i].score)
+    return results
+
+
+async def agrade_answers(llm, items, pack_size=DEFAULT_PACK_SIZE, max_concurrency=4, cache=None, sessions=None):
+    """Grade (question, correct_answer, user_answer) triples; returns GradeResults in input order.
+
+    `sessions` gives the viva session of each item when the items come from more than one
+    (e.g. re-grading archived vivas); only items of the same session are packed together.
+    Without it, all items are taken to be from one session.
+    """
+    items = list(items)
+    if sessions is not None:
+        sessions = list(sessions)
+        if len(sessions) != len(items):
+            raise ValueError(f"expected {len(items)} sessions, got {len(sessions)}")
+    with span("grading.batch", items=len(items)) as trace:
+        return await _agrade_answers(llm, items, pack_size, max_concurrency, cache, sessions, trace)
+
+
+def grade_answers(llm, items, pack_size=DEFAULT_PACK_SIZE, max_concurrency=4, cache=None, sessions=None):
+    return asyncio.run(agrade_answers(llm, items, pack_size, max_concurrency, cache, sessions))
+
+
+def grade_answer(llm, question, correct_answer, user_answer, cache=None):
+    """Grade a single answer with one request (or none, if it is cached)."""
+    with span("grading.answer", answer_chars=len(user_answer)) as trace:
+        key = None
+        if cache is not None:
+            key = cache.key(model_id(llm), PROMPT_VERSION, question, correct_answer, user_answer)
+            score = cache.get(key)
+            trace.set(cached=score is not None)
+            if score is not None:
+                return GradeResult(score, None)
+        try:
+            result = llm.invoke(build_prompt(question, correct_answer, user_answer))
+            score = parse_score(result.content)
+        except Exception as e:
+            trace.set(failed=f"{type(e).__name__}: {e}")
+            return GradeResult(None, e)
+        if cache is not None:
+            cache.put(key, score)
+        return GradeResult(score, None)
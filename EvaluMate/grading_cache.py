@@ -0,0 +1,103 @@
+'''
+Cache of grading results.
+
+Grading runs at temperature 0, so the same (model, prompt version, question,
+correct answer, student answer) always earns the same score. Student answers
+are compared after collapsing whitespace, so a resubmission that only differs
+in spacing or line breaks is a hit.
+
+Two tiers: an in-memory LRU for this process and a SQLite table that survives
+restarts. Disk hits are promoted to memory. Hit/miss counters are in `stats()`.
+'''
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_DB_PATH = os.getenv(
+    "EVALUMATE_GRADING_CACHE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "grading_cache.sqlite3")
+)
+DEFAULT_MEMORY_ENTRIES = 4096
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS grades (
+    key TEXT PRIMARY KEY,
+    score INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def normalize_answer(text):
+    return " ".join(text.split())
+
+
+class GradingCache:
+    def __init__(self, path=DEFAULT_DB_PATH, memory_entries=DEFAULT_MEMORY_ENTRIES):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            with self._lock:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def key(model_name, prompt_version, question, correct_answer, user_answer):
+        raw = json.dumps(
+            [model_name, prompt_version, question.strip(), correct_answer.strip(), normalize_answer(user_answer)]
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _remember(self, key, score):
+        self._memory[key] = score
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Cached score for `key`, or None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+            row = None
+            if self._conn is not None:
+                row = self._conn.execute("SELECT score FROM grades WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, key, score):
+        with self._lock:
+            self._remember(key, score)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO grades (key, score, created_at) VALUES (?, ?, ?)",
+                        (key, score, time.time()),
+                    )
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
@@ -0,0 +1,164 @@
+'''
+Indexed adaptive item selection for large question banks.
+
+Each difficulty level has a ready queue (a min-heap of item indices, so the
+earliest generated question of a level comes first) and a bitmap records which
+items have been answered. Picking "the next unused item at level L, else the
+nearest level" pops answered items off the heap lazily, so it is O(log n)
+amortized instead of a scan over the whole bank.
+
+Visited items are kept on a back/forward history for Previous/Next navigation,
+and `undo()` reverts the last answer so its item becomes selectable again.
+
+Run this file directly for micro-benchmarks against the linear scan.
+'''
+import heapq
+
+LEVELS = ("Easy", "Moderate", "Difficult")
+
+
+class ItemSelector:
+    def __init__(self, levels=LEVELS):
+        self.levels = tuple(levels)
+        self.item_levels = []
+        self.used_count = 0
+        self._ready = {level: [] for level in self.levels}
+        self._used = bytearray()
+        self._answered = []  # indices in the order they were marked used
+        self._back = []
+        self._forward = []
+        self.current = None
+
+    def __len__(self):
+        return len(self.item_levels)
+
+    # ---------- items ----------
+    def add(self, level):
+        """Register a new item at `level`; returns its index."""
+        index = len(self.item_levels)
+        self.item_levels.append(level)
+        if index >> 3 >= len(self._used):
+            self._used.append(0)
+        heapq.heappush(self._ready[level], index)
+        return index
+
+    def is_used(self, index):
+        return bool(self._used[index >> 3] & (1 << (index & 7)))
+
+    def mark_used(self, index):
+        if self.is_used(index):
+            return
+        self._used[index >> 3] |= 1 << (index & 7)
+        self.used_count += 1
+        self._answered.append(index)
+
+    def undo(self):
+        """Revert the most recent mark_used; returns that index (or None)."""
+        if not self._answered:
+            return None
+        index = self._answered.pop()
+        self._used[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+        self.used_count -= 1
+        heapq.heappush(self._ready[self.item_levels[index]], index)
+        return index
+
+    @property
+    def all_used(self):
+        return self.used_count >= len(self.item_levels)
+
+    # ---------- selection ----------
+    def _peek(self, level):
+        heap = self._ready[level]
+        while heap and self.is_used(heap[0]):
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def next_unused(self, level):
+        """Earliest unused item at `level`, falling back to the nearest level (easier first on ties)."""
+        position = self.levels.index(level)
+        by_distance = sorted(range(len(self.levels)), key=lambda i: (abs(i - position), i))
+        for i in by_distance:
+            index = self._peek(self.levels[i])
+            if index is not None:
+                return index
+        return None
+
+    # ---------- navigation ----------
+    def visit(self, index):
+        """Move to `index`, remembering where we were for back()."""
+        if self.current is not None and index != self.current:
+            self._back.append(self.current)
+            self._forward.clear()
+        self.current = index
+
+    def can_go_back(self):
+        return bool(self._back)
+
+    def can_go_forward(self):
+        return bool(self._forward)
+
+    def back(self):
+        if self._back:
+            self._forward.append(self.current)
+            self.current = self._back.pop()
+        return self.current
+
+    def forward(self):
+        if self._forward:
+            self._back.append(self.current)
+            self.current = self._forward.pop()
+        return self.current
+
+
+if __name__ == "__main__":
+    import random
+    import timeit
+
+    N = 10_000
+    OPS = 1_000
+    random.seed(0)
+    levels = [random.choice(LEVELS) for _ in range(N)]
+
+    def build():
+        selector = ItemSelector()
+        for level in levels:
+            selector.add(level)
+        return selector
+
+    def linear_next(used, level):
+        # The original get_next_question: two scans with `i not in used` against a list
+        for i, item_level in enumerate(levels):
+            if item_level == level and i not in used:
+                return i
+        for i in range(len(levels)):
+            if i not in used:
+                return i
+        return None
+
+    def run_linear(ops):
+        used = []
+        for k in range(ops):
+            index = linear_next(used, LEVELS[k % 3])
+            used.append(index)
+
+    def run_selector(selector, ops):
+        for k in range(ops):
+            index = selector.next_unused(LEVELS[k % 3])
+            selector.mark_used(index)
+
+    build_time = min(timeit.repeat(build, number=1, repeat=5))
+    print(f"build {N} items:                  {build_time * 1e3:8.2f} ms")
+
+    linear = min(timeit.repeat(lambda: run_linear(OPS), number=1, repeat=3))
+    print(f"linear scan, {OPS} picks at {N}:  {linear / OPS * 1e6:8.2f} us/pick")
+
+    indexed = min(timeit.repeat(lambda: run_selector(build(), OPS), number=1, repeat=5)) - build_time
+    print(f"ItemSelector, {OPS} picks at {N}: {indexed / OPS * 1e6:8.2f} us/pick")
+
+    full = min(timeit.repeat(lambda: run_selector(build(), N), number=1, repeat=5)) - build_time
+    print(f"ItemSelector, all {N} picks:      {full * 1e3:8.2f} ms total")
+
+    selector = build()
+    run_selector(selector, N // 2)
+    undo = timeit.timeit(lambda: (selector.undo(), selector.mark_used(selector.next_unused("Easy"))), number=OPS)
+    print(f"undo + re-pick:                   {undo / OPS * 1e6:8.2f} us/op")
@@ -0,0 +1,58 @@
+'''
+LangChain callback that records every chat model call as an "llm.call" span.
+
+Attached to each model by `models.chat_model`, so invoke, stream, batch and
+the async variants are all traced without touching the call sites. A span
+records the model, prompt tokens, completion tokens when the provider reports
+them, and time to first token for streamed calls. It becomes a child of
+whatever span was current when the call started.
+'''
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from chunking import count_tokens
+from tracing import current_span, record_span
+
+
+class LLMTracer(BaseCallbackHandler):
+    # Run in the caller's context (not an executor thread) so the current span is the caller's
+    run_inline = True
+
+    def __init__(self):
+        self._runs = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model") or params.get("_type")
+        text = "\n".join(str(message.content) for batch in messages for message in batch)
+        self._runs[run_id] = {
+            "start": time.perf_counter(),
+            "first_token": None,
+            "parent": current_span(),
+            "model": model,
+            "prompt_tokens": count_tokens(text),
+        }
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and run["first_token"] is None and token:
+            run["first_token"] = time.perf_counter()
+
+    def _record(self, run_id, error=None, completion_tokens=None):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        attrs = {"model": run["model"], "prompt_tokens": run["prompt_tokens"]}
+        if completion_tokens is not None:
+            attrs["completion_tokens"] = completion_tokens
+        if run["first_token"] is not None:
+            attrs["ttft_ms"] = round((run["first_token"] - run["start"]) * 1000, 3)
+        record_span("llm.call", run["start"], time.perf_counter(), parent=run["parent"], error=error, **attrs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self._record(run_id, completion_tokens=usage.get("completion_tokens"))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._record(run_id, error=f"{type(error).__name__}: {error}")
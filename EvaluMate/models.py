@@ -0,0 +1,48 @@
+'''
+Chat model construction shared by the apps.
+
+    llm = chat_model(ChatGroq, temperature=0, groq_api_key=..., model_name="llama3-70b-8192")
+
+This is `ChatGroq(...)` with the LLMTracer callback attached, so every call is
+traced. When EVALUMATE_FAKE_LLM is set (benchmarks, offline runs), the offline
+FakeChatModel from fake_llm.py stands in for the real model instead:
+
+    EVALUMATE_FAKE_LLM=synth    cassette replies when recorded, synthesized otherwise
+    EVALUMATE_FAKE_LLM=replay   cassette replies only; a missing request is an error
+    EVALUMATE_FAKE_LLM=record   real model on cassette misses, recorded to the cassette
+    EVALUMATE_CASSETTE=path     cassette file (none by default)
+    EVALUMATE_FAKE_LATENCY=0.3  EVALUMATE_FAKE_TOKENS_PER_SECOND=200
+'''
+import os
+
+from llm_tracing import LLMTracer
+
+llm_tracer = LLMTracer()
+
+
+def chat_model(factory, **kwargs):
+    """`factory(**kwargs)`, or a FakeChatModel standing in for it when EVALUMATE_FAKE_LLM is set.
+
+    Either way the model gets the LLMTracer callback, so every call is traced.
+    """
+    callbacks = [*(kwargs.get("callbacks") or []), llm_tracer]
+    mode = os.getenv("EVALUMATE_FAKE_LLM", "").strip().lower()
+    if mode in ("", "0", "off", "false", "no"):
+        return factory(**dict(kwargs, callbacks=callbacks))
+    if mode not in ("1", "on", "true", "yes", "synth", "replay", "record"):
+        raise ValueError(f"EVALUMATE_FAKE_LLM must be synth, replay or record, not {mode!r}")
+
+    # Only imported when asked for, so production runs never load the test double
+    from fake_llm import FakeChatModel
+
+    name = kwargs.get("model_name") or kwargs.get("model") or getattr(factory, "__name__", "model")
+    return FakeChatModel(
+        # A separate name keeps fake scores and questions out of the real caches and question bank
+        model_name=f"fake/{name}",
+        latency=float(os.getenv("EVALUMATE_FAKE_LATENCY", "0.3")),
+        tokens_per_second=float(os.getenv("EVALUMATE_FAKE_TOKENS_PER_SECOND", "200")),
+        cassette_path=os.getenv("EVALUMATE_CASSETTE") or None,
+        inner=factory(**kwargs) if mode == "record" else None,
+        replay_only=mode == "replay",
+        callbacks=callbacks,
+    )
@@ -0,0 +1,112 @@
+'''
+Process-wide cache of extracted PDF documents.
+
+Streamlit re-executes the app script on every interaction, but imported modules
+stay loaded, so a cache kept here is shared by every session and every rerun.
+Entries are keyed by a SHA-256 of the uploaded bytes, so the same book uploaded
+by fifty students is parsed once, even when they all upload it at the same
+moment: later callers wait for the extraction already in progress instead of
+starting their own. The cache is bounded by an approximate memory
+budget and evicts the least recently used book first.
+'''
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from document import Document
+from pdf_extraction import extract_pages
+from tracing import span
+
+DEFAULT_MAX_BYTES = int(os.getenv("EVALUMATE_PDF_CACHE_MB", "256")) * 1024 * 1024
+
+
+def document_key(pdf_bytes):
+    """Content hash used to identify an uploaded PDF."""
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def _entry_size(document):
+    return sys.getsizeof(document.text) + 2 * 8 * document.page_count
+
+
+class PDFTextCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (document, size)
+        self._pending = {}  # key -> Future of an extraction in progress
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        # Call with the lock held
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def get(self, key):
+        """Return the cached Document for `key`, or None."""
+        with self._lock:
+            return self._lookup(key)
+
+    def put(self, key, document):
+        size = _entry_size(document)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (document, size)
+            self.current_bytes += size
+            # Always keep the newest entry, even if it alone is over budget
+            while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def get_or_extract(self, pdf_bytes):
+        """Return (key, document), extracting the PDF only if it is not cached yet.
+
+        Pages are stripped, empty pages skipped and pages joined by a blank line,
+        matching how the EvaluMate scripts have always assembled the book.
+        """
+        with span("pdf.cache", bytes=len(pdf_bytes)) as s:
+            key = document_key(pdf_bytes)
+            with self._lock:
+                document = self._lookup(key)
+                future = None if document is not None else self._pending.get(key)
+                extract = document is None and future is None
+                if extract:
+                    future = self._pending[key] = Future()
+            s.set(hit=document is not None, waited=not extract and document is None)
+            if extract:
+                try:
+                    document = Document.from_pages(
+                        extract_pages(pdf_bytes), separator="\n\n", strip=True, skip_empty=True, doc_id=key
+                    )
+                    self.put(key, document)
+                    future.set_result(document)
+                except BaseException as e:
+                    future.set_exception(e)
+                    raise
+                finally:
+                    with self._lock:
+                        self._pending.pop(key, None)
+            elif document is None:
+                # Someone else is extracting this book right now; share their result
+                document = future.result()
+            s.set(pages=document.page_count, chars=len(document.text))
+        return key, document
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Shared by all sessions in this Streamlit process
+pdf_text_cache = PDFTextCache()
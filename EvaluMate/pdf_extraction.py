@@ -0,0 +1,97 @@
+'''
+PDF text extraction helpers shared by the EvaluMate apps.
+
+`source` is either the raw bytes of an uploaded PDF or a path on disk.
+
+Large documents are split into contiguous page ranges and extracted on a
+process pool. Each worker opens its own document handle once (fitz documents
+cannot be shared between processes) and the ranges are reassembled in page
+order, so the result is identical to walking the pages serially. At most
+EVALUMATE_PDF_POOLS (default 1) pools run at once across the process; further
+large extractions wait for a pool slot instead of each starting another
+`os.cpu_count()` worker processes.
+'''
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+from tracing import span
+
+# Below this many pages per worker, process start-up costs more than it saves
+MIN_PAGES_PER_WORKER = 40
+# Split into several ranges per worker so a slow range does not hold up the pool
+RANGES_PER_WORKER = 4
+MAX_CONCURRENT_POOLS = int(os.getenv("EVALUMATE_PDF_POOLS", "1"))
+
+_pool_slots = threading.BoundedSemaphore(MAX_CONCURRENT_POOLS)
+
+_worker_doc = None
+
+
+def open_pdf(source):
+    """Open a PDF from raw bytes or from a file path."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=bytes(source), filetype="pdf")
+    return fitz.open(source)
+
+
+def _init_worker(source):
+    global _worker_doc
+    _worker_doc = open_pdf(source)
+
+
+def _extract_range(page_range):
+    start, stop = page_range
+    return [_worker_doc[i].get_text() for i in range(start, stop)]
+
+
+def _split_pages(page_count, parts):
+    """Split range(page_count) into `parts` contiguous (start, stop) ranges."""
+    size, extra = divmod(page_count, parts)
+    ranges = []
+    start = 0
+    for i in range(parts):
+        stop = start + size + (1 if i < extra else 0)
+        if stop > start:
+            ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def extract_pages(source, workers=None, min_pages_per_worker=MIN_PAGES_PER_WORKER):
+    """Return the raw `page.get_text()` of every page, in page order."""
+    with span("pdf.extract") as s:
+        with open_pdf(source) as doc:
+            page_count = doc.page_count
+            workers = min(workers or os.cpu_count() or 1, page_count // min_pages_per_worker)
+            s.set(pages=page_count, workers=max(workers, 1))
+            if workers <= 1:
+                return [page.get_text() for page in doc]
+
+        if isinstance(source, (bytearray, memoryview)):
+            source = bytes(source)
+        ranges = _split_pages(page_count, workers * RANGES_PER_WORKER)
+        # "spawn" behaves the same on every platform and avoids forking a threaded Streamlit server
+        with _pool_slots, ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(source,),
+        ) as pool:
+            texts = []
+            for chunk in pool.map(_extract_range, ranges):
+                texts.extend(chunk)
+        return texts
+
+
+def extract_page_texts(source, workers=None):
+    """Return {page_number: text} for every page that has text (page numbers start at 1)."""
+    pages = {}
+    for i, text in enumerate(extract_pages(source, workers=workers)):
+        text = text.strip()
+        if text:
+            pages[i + 1] = text
+    return pages
@@ -0,0 +1,156 @@
+'''
+Incremental parsers for generated question banks.
+
+Both parsers are fed raw text as it streams from the model (`feed()` may be
+called with any fragment, even half a word) and return each Q/A item as soon
+as it is complete, instead of waiting for the whole response.
+
+- QALineStreamParser: the "Easy:" / "Q1: ..." / "A1: ..." layout.
+- QAJsonStreamParser: {"easy": [{"question": ..., "answer": ...}], ...}
+
+Lines that cannot be placed are kept in `skipped` rather than silently dropped.
+'''
+import json
+import re
+
+LEVEL_NAMES = {"easy": "Easy", "moderate": "Moderate", "medium": "Moderate", "difficult": "Difficult", "hard": "Difficult"}
+
+# "Q1:", "**Q1.**", "A 3)", "Question 2:" ...
+_QA_LINE = re.compile(r"^[*#\s]*(Q|A|Question|Answer)\s*\d*\s*[*]*\s*[:.)-]\s*[*]*\s*(.*)$", re.IGNORECASE)
+# "Easy:", "**Moderate Questions**", "### Hard level:" ... but not prose that happens to contain the word
+_LEVEL_HEADER = re.compile(r"^\W*(easy|moderate|medium|difficult|hard)\b[^:]*:?\W*$", re.IGNORECASE)
+
+
+def _new_qa(level, question, answer):
+    return {"level": level, "question": question, "answer": answer, "user_answer": "", "score": None}
+
+
+class QALineStreamParser:
+    def __init__(self):
+        self.level = None
+        self.question = None
+        self.skipped = []
+        self._buffer = ""
+
+    def feed(self, text):
+        """Add streamed text; return the Q/A items completed by it."""
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split("\n")
+        items = []
+        for line in lines:
+            item = self._line(line)
+            if item:
+                items.append(item)
+        return items
+
+    def close(self):
+        """Flush the last (unterminated) line at the end of the stream."""
+        line, self._buffer = self._buffer, ""
+        item = self._line(line)
+        if self.question is not None:
+            self.skipped.append(f"Q: {self.question}")
+            self.question = None
+        return [item] if item else []
+
+    def _line(self, line):
+        line = line.strip()
+        if not line:
+            return None
+        match = _QA_LINE.match(line)
+        if match is None:
+            if self.question is not None:
+                # A question wrapped over several lines; its answer has not come yet
+                self.question = f"{self.question} {line}"
+                return None
+            level = _LEVEL_HEADER.match(line)
+            if level and len(line) < 40:
+                self.level = LEVEL_NAMES[level.group(1).lower()]
+            else:
+                self.skipped.append(line)
+            return None
+
+        kind, content = match.group(1)[0].upper(), match.group(2).strip()
+        if self.level is None or not content:
+            self.skipped.append(line)
+            return None
+        if kind == "Q":
+            if self.question is not None:
+                self.skipped.append(f"Q: {self.question}")
+            self.question = content
+            return None
+        if self.question is None:
+            self.skipped.append(line)
+            return None
+        item = _new_qa(self.level, self.question, content)
+        self.question = None
+        return item
+
+
+class QAJsonStreamParser:
+    """Emits each {"question", "answer"} object as soon as its closing brace arrives."""
+
+    def __init__(self):
+        self.skipped = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string = []
+        self._last_key = None
+        self._level = None
+        self._item = None  # characters of the item object being read
+
+    def feed(self, text):
+        items = []
+        for char in text:
+            item = self._char(char)
+            if item:
+                items.append(item)
+        return items
+
+    def close(self):
+        return []
+
+    def _char(self, char):
+        if self._item is not None:
+            self._item.append(char)
+
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._depth == 1:
+                    self._last_key = "".join(self._string)
+            else:
+                self._string.append(char)
+            return None
+
+        if char == '"':
+            self._in_string = True
+            self._string = []
+        elif char in "{[":
+            self._depth += 1
+            if char == "[" and self._depth == 2:
+                self._level = LEVEL_NAMES.get((self._last_key or "").lower())
+            elif char == "{" and self._depth == 3:
+                self._item = [char]
+        elif char in "}]":
+            self._depth -= 1
+            if char == "}" and self._depth == 2 and self._item is not None:
+                raw, self._item = "".join(self._item), None
+                return self._parse_item(raw)
+        return None
+
+    def _parse_item(self, raw):
+        try:
+            obj = json.loads(raw)
+            question, answer = obj["question"].strip(), obj["answer"].strip()
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.skipped.append(raw)
+            return None
+        if self._level is None:
+            self.skipped.append(raw)
+            return None
+        return _new_qa(self._level, question, answer)
@@ -0,0 +1,248 @@
+'''
+Map-reduce viva question generation.
+
+Map: the document is split into chunks that fit the model's context, and a
+handful of Easy/Moderate/Difficult Q/A pairs is drafted for every chunk
+concurrently (with a concurrency limit), so wall-clock time follows the
+slowest chunk rather than the size of the book.
+
+Reduce: drafts are de-duplicated and 5 questions per level are kept, spread
+across the chunks so the whole book is covered. No chunk contributes more than
+its share of a level until every chunk has finished; only then are its extra
+questions used to fill any gaps.
+
+`astream_question_bank` streams the drafts and yields every Q/A pair the
+moment its answer line is complete and it passes the reduce step.
+`QuestionBankJob` drives it on a background thread so the viva can start as
+soon as the first question exists, and `shared_question_job` lets every
+session that opens the same book meanwhile follow that one job.
+'''
+import asyncio
+import contextvars
+import hashlib
+import math
+import re
+import threading
+from collections import defaultdict
+
+from chunking import chunk_document, context_budget
+from qa_stream_parser import QALineStreamParser
+from tracing import end_span, start_span
+
+LEVELS = ("Easy", "Moderate", "Difficult")
+QUESTIONS_PER_LEVEL = 5
+# Draft a few more than needed so duplicates and unparsable lines can be dropped
+DRAFT_MARGIN = 1.5
+
+CHUNK_PROMPT = """
+You are an expert examiner. Based on the following content:
+
+--- CONTENT START ---
+{content}
+--- CONTENT END ---
+
+Generate {total} viva questions along with their answers:
+- {per_level} Easy
+- {per_level} Moderate
+- {per_level} Difficult
+
+Format exactly like this:
+
+Easy:
+Q1: ...
+A1: ...
+...
+
+Moderate:
+Q{moderate_start}: ...
+A{moderate_start}: ...
+...
+
+Difficult:
+Q{difficult_start}: ...
+A{difficult_start}: ...
+...
+"""
+
+
+def bank_version(model_name):
+    """Identifies questions made by this model and prompt, so stored banks are not mixed across versions."""
+    return hashlib.sha256(f"{model_name}\n{CHUNK_PROMPT}".encode("utf-8")).hexdigest()[:16]
+
+
+def build_prompt(content, per_level=QUESTIONS_PER_LEVEL):
+    return CHUNK_PROMPT.format(
+        content=content,
+        total=per_level * len(LEVELS),
+        per_level=per_level,
+        moderate_start=per_level + 1,
+        difficult_start=2 * per_level + 1,
+    )
+
+
+def _normalize(question):
+    return re.sub(r"\W+", " ", question).strip().lower()
+
+
+def _plan(document, model_name, per_level, reserve):
+    """Chunks to draft from and how many questions per level to ask of each."""
+    chunks = chunk_document(document, context_budget(model_name, reserve), model_name)
+    per_chunk = min(per_level, math.ceil(per_level * DRAFT_MARGIN / max(len(chunks), 1)))
+    return chunks, per_chunk
+
+
+def _spread(chunks):
+    """Chunk order that jumps around the book, so whichever chunks finish first still cover all of it."""
+    golden = (5 ** 0.5 - 1) / 2
+    order = sorted(range(len(chunks)), key=lambda i: (i * golden) % 1)
+    return [chunks[i] for i in order]
+
+
+_DONE = object()
+
+
+async def astream_question_bank(llm, document, model_name, per_level=QUESTIONS_PER_LEVEL,
+                                max_concurrency=4, reserve=2500):
+    """Yield Q/A pairs as they stream in, until per_level unique questions exist for every level."""
+    chunks, per_chunk = _plan(document, model_name, per_level, reserve)
+    queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def draft(index, chunk):
+        async with semaphore:
+            parser = QALineStreamParser()
+            try:
+                async for piece in llm.astream(build_prompt(str(chunk), per_chunk)):
+                    for item in parser.feed(piece.content):
+                        item["pages"] = chunk.page_numbers
+                        await queue.put((index, item))
+                for item in parser.close():
+                    item["pages"] = chunk.page_numbers
+                    await queue.put((index, item))
+            except Exception as e:
+                await queue.put(e)
+
+    tasks = [asyncio.create_task(draft(index, chunk)) for index, chunk in enumerate(_spread(chunks))]
+
+    async def finish():
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await queue.put(_DONE)
+
+    finisher = asyncio.create_task(finish())
+    counts = {level: 0 for level in LEVELS}
+    # A chunk's share of each level; questions beyond it are held back until every chunk is done
+    share = math.ceil(per_level / max(len(chunks), 1))
+    taken = defaultdict(int)  # (chunk index, level) -> questions yielded
+    held = []
+    seen = set()
+    errors = []
+    try:
+        while any(count < per_level for count in counts.values()):
+            entry = await queue.get()
+            if entry is _DONE:
+                break
+            if isinstance(entry, Exception):
+                errors.append(entry)
+                continue
+            index, item = entry
+            level = item["level"]
+            key = _normalize(item["question"])
+            if counts[level] >= per_level or not key or key in seen:
+                continue
+            seen.add(key)
+            if taken[index, level] >= share:
+                held.append((index, item))
+                continue
+            taken[index, level] += 1
+            counts[level] += 1
+            yield item
+
+        # Some chunks drafted too little: fill the gaps from the held-back questions, least-used chunks first
+        held.sort(key=lambda entry: taken[entry[0], entry[1]["level"]])
+        for index, item in held:
+            if counts[item["level"]] < per_level:
+                counts[item["level"]] += 1
+                yield item
+    finally:
+        # Enough questions (or the consumer went away): stop the remaining drafts
+        for task in tasks:
+            task.cancel()
+        finisher.cancel()
+    if errors and not seen:
+        raise errors[0]
+
+
+class QuestionBankJob:
+    """Streams a question bank on a background thread; `items` grows as questions arrive.
+
+    `on_item(item)` is called on the background thread for every item before it
+    becomes visible in `items` (e.g. to persist it), and `on_done(job)` once the
+    job has ended.
+    """
+
+    def __init__(self, llm, document, model_name, per_level=QUESTIONS_PER_LEVEL,
+                 max_concurrency=4, reserve=2500, on_item=None, on_done=None):
+        self.items = []
+        self._on_item = on_item
+        self._on_done = on_done
+        self.done = False
+        self.error = None
+        self._args = (llm, document, model_name, per_level, max_concurrency, reserve)
+        self._condition = threading.Condition()
+        # Run in a copy of the caller's context so the job's spans belong to the rerun that started it
+        context = contextvars.copy_context()
+        self._thread = threading.Thread(target=context.run, args=(self._run,), daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        async def consume():
+            async for item in astream_question_bank(*self._args):
+                if self._on_item is not None:
+                    self._on_item(item)
+                with self._condition:
+                    self.items.append(item)
+                    self._condition.notify_all()
+
+        trace = start_span("questions.generate", per_level=self._args[3])
+        try:
+            asyncio.run(consume())
+        except Exception as e:
+            self.error = e
+        finally:
+            if self.error is not None:
+                trace.error = f"{type(self.error).__name__}: {self.error}"
+            end_span(trace, items=len(self.items))
+            with self._condition:
+                self.done = True
+                self._condition.notify_all()
+            if self._on_done is not None:
+                self._on_done(self)
+
+    def wait_for(self, count, timeout=None):
+        """Block until at least `count` items exist or the job ends; returns the item count."""
+        with self._condition:
+            self._condition.wait_for(lambda: len(self.items) >= count or self.done, timeout)
+            return len(self.items)
+
+    def items_since(self, start):
+        with self._condition:
+            return self.items[start:]
+
+
+_jobs = {}  # key -> QuestionBankJob still running
+_jobs_lock = threading.Lock()
+
+
+def shared_question_job(key, *args, **kwargs):
+    """The running QuestionBankJob for `key` (e.g. (pdf_key, pool_version)), started with these arguments if none is.
+
+    Sessions that open a book while its bank is being generated read the same
+    stream instead of each generating the whole book again.
+    """
+    with _jobs_lock:
+        for finished in [k for k, job in _jobs.items() if job.done]:
+            del _jobs[finished]
+        job = _jobs.get(key)
+        if job is None:
+            job = _jobs[key] = QuestionBankJob(*args, **kwargs)
+        return job
@@ -0,0 +1,157 @@
+'''
+Persistent question bank, stored in a local SQLite file.
+
+Generated Q/A items are kept per document (content hash of the PDF) and per
+bank version (a hash of the model name and the generation prompt, so changing
+either starts a new pool). Sessions draw the least-used items of each level,
+with random tie-breaks, so students who upload the same book get varied
+questions without another LLM call. Fresh generation is only needed once a
+level has fewer than `per_level` items left under `max_uses`.
+
+Every finished generation run is recorded with the number of new questions it
+stored (`record_run`). Once a refill adds nothing new, the book is treated as
+exhausted for that bank version: `needs_refill` stays false and `draw` keeps
+handing out the least-used questions, even past `max_uses`.
+'''
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_DB_PATH = os.getenv(
+    "EVALUMATE_QUESTION_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "question_bank.sqlite3")
+)
+DEFAULT_MAX_USES = 25
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    doc_hash TEXT NOT NULL,
+    bank_version TEXT NOT NULL,
+    level TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    pages TEXT,
+    uses INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    UNIQUE (doc_hash, bank_version, question)
+);
+CREATE INDEX IF NOT EXISTS questions_pool ON questions (doc_hash, bank_version, level, uses);
+CREATE TABLE IF NOT EXISTS generation_runs (
+    doc_hash TEXT NOT NULL,
+    bank_version TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    added INTEGER NOT NULL
+);
+"""
+
+
+def _row_to_qa(row):
+    id_, level, question, answer, pages = row
+    return {
+        "id": id_,
+        "level": level,
+        "question": question,
+        "answer": answer,
+        "pages": json.loads(pages) if pages else [],
+        "user_answer": "",
+        "score": None,
+    }
+
+
+class QuestionStore:
+    def __init__(self, path=DEFAULT_DB_PATH, max_uses=DEFAULT_MAX_USES):
+        self.path = path
+        self.max_uses = max_uses
+        # One connection shared by Streamlit's script threads and the generation threads
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def add(self, doc_hash, bank_version, items):
+        """Store generated items (duplicates are ignored) and set each item's "id"."""
+        now = time.time()
+        with self._lock, self._conn:
+            for item in items:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO questions (doc_hash, bank_version, level, question, answer, pages, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (doc_hash, bank_version, item["level"], item["question"], item["answer"],
+                     json.dumps(item.get("pages", [])), now),
+                )
+                row = self._conn.execute(
+                    "SELECT id FROM questions WHERE doc_hash = ? AND bank_version = ? AND question = ?",
+                    (doc_hash, bank_version, item["question"]),
+                ).fetchone()
+                item["id"] = row[0]
+
+    def mark_used(self, ids):
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE questions SET uses = uses + 1 WHERE id = ?", [(i,) for i in ids])
+
+    def available(self, doc_hash, bank_version):
+        """{level: number of items used fewer than max_uses times}."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT level, COUNT(*) FROM questions WHERE doc_hash = ? AND bank_version = ? AND uses < ? "
+                "GROUP BY level",
+                (doc_hash, bank_version, self.max_uses),
+            ).fetchall()
+        return dict(rows)
+
+    def count(self, doc_hash, bank_version):
+        """Number of stored items, used or not."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM questions WHERE doc_hash = ? AND bank_version = ?", (doc_hash, bank_version)
+            ).fetchone()[0]
+
+    def record_run(self, doc_hash, bank_version, started_at):
+        """Record a finished generation run that started at `started_at`; returns how many new items it stored."""
+        with self._lock, self._conn:
+            added = self._conn.execute(
+                "SELECT COUNT(*) FROM questions WHERE doc_hash = ? AND bank_version = ? AND created_at >= ?",
+                (doc_hash, bank_version, started_at),
+            ).fetchone()[0]
+            self._conn.execute(
+                "INSERT INTO generation_runs (doc_hash, bank_version, started_at, added) VALUES (?, ?, ?, ?)",
+                (doc_hash, bank_version, started_at, added),
+            )
+        return added
+
+    def exhausted(self, doc_hash, bank_version):
+        """True if the last generation run for this book added no new questions."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT added FROM generation_runs WHERE doc_hash = ? AND bank_version = ? "
+                "ORDER BY started_at DESC LIMIT 1",
+                (doc_hash, bank_version),
+            ).fetchone()
+        return row is not None and row[0] == 0
+
+    def needs_refill(self, doc_hash, bank_version, levels, per_level):
+        available = self.available(doc_hash, bank_version)
+        if all(available.get(level, 0) >= per_level for level in levels):
+            return False
+        return not self.exhausted(doc_hash, bank_version)
+
+    def draw(self, doc_hash, bank_version, levels, per_level):
+        """Take the per_level least-used items of each level and count this use.
+
+        Items under max_uses come first; worn-out ones are only drawn when the book is exhausted.
+        """
+        items = []
+        with self._lock, self._conn:
+            for level in levels:
+                rows = self._conn.execute(
+                    "SELECT id, level, question, answer, pages FROM questions "
+                    "WHERE doc_hash = ? AND bank_version = ? AND level = ? "
+                    "ORDER BY uses, RANDOM() LIMIT ?",
+                    (doc_hash, bank_version, level, per_level),
+                ).fetchall()
+                items.extend(_row_to_qa(row) for row in rows)
+            self._conn.executemany("UPDATE questions SET uses = uses + 1 WHERE id = ?", [(qa["id"],) for qa in items])
+        return items
@@ -0,0 +1,144 @@
+'''
+Passage retrieval, so prompts carry the relevant part of the book instead of all of it.
+
+    context = relevant_context(document, question + "\n" + answer, max_tokens=2000)
+
+The document is split into small page-aware passages (chunking.chunk_document)
+and indexed with BM25 once per document hash; the index is shared by every
+session in the process. It holds passage numbers, not the passages or the
+document, and the index cache is bounded by EVALUMATE_INDEX_CACHE_MB, so books
+evicted from the PDF cache are freed. A query then only touches the posting
+lists of its own terms, and the top-k passages that fit the token budget are
+returned in document order. A document that fits the budget anyway is returned whole, so
+small books are graded exactly as before.
+
+`window_context()` picks a contiguous stretch of the book instead, for prompts
+that have no query (e.g. "ask a question about this content").
+'''
+import heapq
+import math
+import os
+import random
+import re
+from collections import Counter, defaultdict
+
+from chunking import LRUCache, chunk_document, count_tokens, document_tokens, get_encoding, leading_text
+from tracing import span
+
+PASSAGE_TOKENS = 250
+TOP_K = 8
+DEFAULT_MAX_TOKENS = 2000
+PASSAGE_SEPARATOR = "\n\n...\n\n"
+INDEX_CACHE_BYTES = int(os.getenv("EVALUMATE_INDEX_CACHE_MB", "64")) * 1024 * 1024
+
+# BM25 parameters (the usual defaults)
+K1 = 1.5
+B = 0.75
+
+_WORD = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i in is it its my of on or our she so "
+    "that the their them then there these they this to was we were what when where which who why will "
+    "with you your".split()
+)
+
+
+def terms(text):
+    return [word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS]
+
+
+class PassageIndex:
+    """BM25 postings over the passages of chunk_document(document, passage_tokens, model_name)."""
+
+    def __init__(self, document, passage_tokens=PASSAGE_TOKENS, model_name=None):
+        passages = chunk_document(document, passage_tokens, model_name)
+        self._postings = defaultdict(list)  # term -> [(passage index, term frequency)]
+        self._lengths = []
+        for i, passage in enumerate(passages):
+            counts = Counter(terms(str(passage)))
+            self._lengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                self._postings[term].append((i, frequency))
+        n = len(passages)
+        self._average_length = sum(self._lengths) / n if n else 0.0
+        self._idf = {
+            term: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+    @property
+    def nbytes(self):
+        """Rough memory footprint: posting tuples and list slots, term keys, passage lengths."""
+        postings = sum(len(p) for p in self._postings.values())
+        return 64 * postings + 200 * len(self._postings) + 8 * len(self._lengths)
+
+    def search(self, query, k=TOP_K):
+        """(score, passage number) of the k best-matching passages, best first; those sharing no term are left out."""
+        scores = defaultdict(float)
+        for term in set(terms(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for i, frequency in self._postings[term]:
+                norm = K1 * (1 - B + B * self._lengths[i] / self._average_length)
+                scores[i] += idf * frequency * (K1 + 1) / (frequency + norm)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(score, i) for i, score in best]
+
+
+_index_cache = LRUCache(max_entries=16, max_bytes=INDEX_CACHE_BYTES, sizeof=lambda index: index.nbytes)
+
+
+def passage_index(document, passage_tokens=PASSAGE_TOKENS, model_name=None):
+    """The BM25 index of a document (built once per document hash and passage size).
+
+    Passage numbers in its results index chunk_document(document, passage_tokens, model_name).
+    """
+    encoding = get_encoding(model_name)
+    key = (document.doc_id, passage_tokens, encoding.name if encoding else None)
+    return _index_cache.get_or_build(key, lambda: PassageIndex(document, passage_tokens, model_name))
+
+
+def _join(passages):
+    return PASSAGE_SEPARATOR.join(str(p) for p in sorted(passages, key=lambda p: p.start))
+
+
+def relevant_context(document, query, max_tokens=DEFAULT_MAX_TOKENS, model_name=None, k=TOP_K):
+    """The whole document if it fits `max_tokens`, else the passages most relevant to `query` that fit."""
+    with span("retrieval.select", doc=document.doc_id[:12], max_tokens=max_tokens) as trace:
+        total = document_tokens(document, model_name)
+        if total <= max_tokens:
+            trace.set(full=True, tokens=total)
+            return document.text
+
+        budget = max_tokens
+        selected = []
+        passages = chunk_document(document, PASSAGE_TOKENS, model_name)
+        for _, i in passage_index(document, model_name=model_name).search(query, k):
+            passage = passages[i]
+            cost = passage.tokens + count_tokens(PASSAGE_SEPARATOR, model_name)
+            if cost <= budget:
+                selected.append(passage)
+                budget -= cost
+        trace.set(full=False, passages=len(selected), tokens=max_tokens - budget, document_tokens=total)
+        if not selected:
+            # Nothing in the book shares a word with the query; better the opening than nothing
+            return leading_text(document, max_tokens, model_name)
+        return _join(selected)
+
+
+def window_context(document, max_tokens=DEFAULT_MAX_TOKENS, model_name=None, seed=None):
+    """The whole document if it fits `max_tokens`, else a contiguous stretch around a randomly chosen passage."""
+    if document_tokens(document, model_name) <= max_tokens:
+        return document.text
+    passages = chunk_document(document, PASSAGE_TOKENS, model_name)
+    first = last = random.Random(seed).randrange(len(passages))
+    budget = max_tokens - passages[first].tokens
+    # Grow forwards, then backwards once the end of the book is reached
+    while last + 1 < len(passages) and passages[last + 1].tokens <= budget:
+        last += 1
+        budget -= passages[last].tokens
+    while first > 0 and passages[first - 1].tokens <= budget:
+        first -= 1
+        budget -= passages[first].tokens
+    return str(document.view(passages[first].start, passages[last].stop))
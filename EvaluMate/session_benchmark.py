@@ -0,0 +1,290 @@
+'''
+Per-session latency benchmark for the EvaluMate Streamlit app.
+
+Runs N students through the viva, each an AppTest session in its own process,
+one timed step at a time:
+
+    upload     extract the PDF through pdf_text_cache
+    load       first render of the app with the document in session state
+    generate   click "Generate Viva Questions" (waits for the first question)
+    answer     type an answer and click "Submit Answer" (repeated)
+    grade_all  click "Grade All Answers", if the button is shown
+    report     click "Generate Report"
+
+AppTest has no file upload, so the extracted document is put into session
+state the same way the upload handler does it.
+
+This measures how long each step takes for one session, with N of them
+competing for the machine's cores. It is not a capacity test of one server.
+AppTest cannot run several sessions in one process (every run installs and
+tears down the global Streamlit Runtime and patches config.get_option
+process-wide), so the students share nothing held in memory: not
+pdf_text_cache, tts_cache, the running question jobs or the GIL. They only
+share the on-disk question bank and grading cache. How one `streamlit run`
+server copes with N sessions has to be measured against a real server.
+
+The model is the offline FakeChatModel (EVALUMATE_FAKE_LLM=synth, see
+models.py and fake_llm.py) unless that variable is already set. Its latency and token rate
+come from EVALUMATE_FAKE_LATENCY and EVALUMATE_FAKE_TOKENS_PER_SECOND. The
+question bank, grading cache and trace file go to a temporary directory, so a
+run starts cold and never touches the real databases or EvaluMate/trace.jsonl.
+
+Reports p50/p95/p99 per step, CPU use and peak RSS per student process:
+
+    python session_benchmark.py --students 20 --answers 3 --books 2
+'''
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_SCRIPT = os.path.join(HERE, "EvaluMate_Updated_Final_July_2025.py")
+
+WORDS = (
+    "energy cell membrane protein enzyme reaction structure function system model theory evidence "
+    "experiment observation variable result method process change pressure force motion wave light "
+    "atom molecule compound element mixture solution acid base temperature heat matter organism"
+).split()
+
+
+def make_pdf(pages, seed):
+    """A synthetic book: `pages` pages of sentences built from WORDS."""
+    import fitz
+
+    rng = random.Random(seed)
+    pdf = fitz.open()
+    for number in range(pages):
+        page = pdf.new_page()
+        sentences = []
+        for _ in range(25):
+            words = rng.sample(WORDS, 8)
+            sentences.append(" ".join(words).capitalize() + ".")
+        text = f"Chapter {number + 1}\n\n" + "\n".join(sentences)
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), text, fontsize=10)
+    data = pdf.tobytes()
+    pdf.close()
+    return data
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def process_usage():
+    """CPU seconds and peak RSS (MB) of this process, including extraction workers it has waited for."""
+    times = os.times()
+    try:
+        import resource
+    except ImportError:  # Windows: no getrusage, so no memory figures
+        own = workers = 0.0
+    else:
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # kilobytes on Linux
+        workers = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return {
+        # Children's times are always 0 on Windows
+        "cpu_seconds": times.user + times.system + times.children_user + times.children_system,
+        "peak_rss_mb": own,
+        "peak_worker_rss_mb": workers,
+    }
+
+
+class Student:
+    def __init__(self, number, pdf_bytes, args, timings, errors):
+        self.number = number
+        self.pdf_bytes = pdf_bytes
+        self.args = args
+        self.timings = timings
+        self.errors = errors
+        self.rng = random.Random(number)
+
+    def _step(self, name, action):
+        started = time.perf_counter()
+        try:
+            result = action()
+        except Exception as e:
+            self.errors[name].append(f"student {self.number}: {e!r}")
+            raise
+        self.timings[name].append(time.perf_counter() - started)
+        return result
+
+    def _run(self, at):
+        at.run(timeout=self.args.timeout)
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+        return at
+
+    def _click(self, at, label_prefix):
+        for button in at.button:
+            if button.label.startswith(label_prefix) and not button.disabled:
+                return self._run(button.click())
+        raise RuntimeError(f"no enabled {label_prefix!r} button")
+
+    def run(self):
+        from streamlit.testing.v1 import AppTest
+        from pdf_cache import pdf_text_cache
+
+        at = AppTest.from_file(self.args.script, default_timeout=self.args.timeout)
+        try:
+            key, document = self._step("upload", lambda: pdf_text_cache.get_or_extract(self.pdf_bytes))
+            at.session_state["pdf_key"] = key
+            at.session_state["pdf_document"] = document
+            self._step("load", lambda: self._run(at))
+            self._step("generate", lambda: self._click(at, "🔍 Generate Viva Questions"))
+
+            for _ in range(self.args.answers):
+                boxes = [box for box in at.text_area if box.label == "Edit Your Answer"]
+                if not boxes:
+                    self.errors["answer"].append(f"student {self.number}: no question to answer")
+                    break
+                boxes[0].input(" ".join(self.rng.sample(WORDS, 12)))
+                self._step("answer", lambda: self._click(at, "✅ Submit Answer"))
+
+            if any(button.label.startswith("📝 Grade All Answers") for button in at.button):
+                self._step("grade_all", lambda: self._click(at, "📝 Grade All Answers"))
+            self._step("report", lambda: self._click(at, "📥 Generate Report"))
+        except Exception:
+            # Already recorded against the step that failed
+            pass
+
+
+def run_student(number, pdf_bytes, args, results):
+    """Body of one student's process: run the viva and put (number, timings, errors, usage) on `results`."""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    timings = defaultdict(list)
+    errors = defaultdict(list)
+    try:
+        Student(number, pdf_bytes, args, timings, errors).run()
+    except Exception as e:
+        errors["process"].append(f"student {number}: {e!r}")
+    results.put((number, dict(timings), dict(errors), process_usage()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=10)
+    parser.add_argument("--answers", type=int, default=3, help="answers submitted per student")
+    parser.add_argument("--books", type=int, default=1, help="distinct PDFs, spread over the students")
+    parser.add_argument("--pdf", help="use this PDF for every book instead of a synthetic one")
+    parser.add_argument("--pages", type=int, default=40, help="pages per synthetic PDF")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds over which students start")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-step script timeout")
+    parser.add_argument("--script", default=APP_SCRIPT)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="evalumate_bench_")
+    os.environ.setdefault("EVALUMATE_FAKE_LLM", "synth")
+    os.environ.setdefault("EVALUMATE_QUESTION_DB", os.path.join(workdir, "question_bank.sqlite3"))
+    os.environ.setdefault("EVALUMATE_GRADING_CACHE_DB", os.path.join(workdir, "grading_cache.sqlite3"))
+    os.environ.setdefault("EVALUMATE_TRACE_FILE", os.path.join(workdir, "trace.jsonl"))
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            data = f.read()
+        books = [data] * args.books
+    else:
+        books = [make_pdf(args.pages, seed) for seed in range(args.books)]
+
+    # Students inherit the environment above; "spawn" gives each a clean interpreter
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(target=run_student, args=(i, books[i % len(books)], args, results), name=f"student-{i}")
+        for i in range(args.students)
+    ]
+
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+        if args.ramp and len(processes) > 1:
+            time.sleep(args.ramp / (len(processes) - 1))
+
+    # Drain the queue before joining, or a student blocked on a full pipe never exits
+    reports = {}
+    while len(reports) < len(processes):
+        try:
+            number, *report = results.get(timeout=1.0)
+            reports[number] = report
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes):
+                break
+    for process in processes:
+        process.join()
+    wall = time.perf_counter() - started
+
+    timings = defaultdict(list)
+    errors = defaultdict(list)
+    per_student = []
+    for number, process in enumerate(processes):
+        if number not in reports:
+            errors["process"].append(f"student {number}: exited with code {process.exitcode} before reporting")
+            continue
+        student_timings, student_errors, student_usage = reports[number]
+        for name, values in student_timings.items():
+            timings[name].extend(values)
+        for name, messages in student_errors.items():
+            errors[name].extend(messages)
+        per_student.append(student_usage)
+
+    cpu = sum(u["cpu_seconds"] for u in per_student)
+    usage = {
+        "wall_seconds": wall,
+        "cpu_seconds": cpu,
+        "mean_cpu_utilization": cpu / wall / (os.cpu_count() or 1),
+        "peak_rss_mb": max((u["peak_rss_mb"] for u in per_student), default=0.0),
+        # Upper bound on the total: every student's peak, as if they all happened at once
+        "sum_peak_rss_mb": sum(u["peak_rss_mb"] for u in per_student),
+        "peak_worker_rss_mb": max((u["peak_worker_rss_mb"] for u in per_student), default=0.0),
+    }
+
+    steps = {}
+    print(f"{args.students} students, {args.books} book(s), {args.answers} answers each, model: "
+          f"{os.environ['EVALUMATE_FAKE_LLM'] or 'live'}")
+    print(f"{'step':<10} {'n':>5} {'errors':>6} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'max s':>8}")
+    for name in ("process", "upload", "load", "generate", "answer", "grade_all", "report"):
+        values = timings.get(name, [])
+        if not values and not errors.get(name):
+            continue
+        row = {
+            "n": len(values),
+            "errors": len(errors.get(name, [])),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": max(values, default=None),
+        }
+        steps[name] = row
+        cells = " ".join(f"{row[k]:8.3f}" if row[k] is not None else f"{'-':>8}" for k in ("p50", "p95", "p99", "max"))
+        print(f"{name:<10} {row['n']:>5} {row['errors']:>6} {cells}")
+
+    print(
+        f"wall {usage['wall_seconds']:.1f}s, cpu {usage['cpu_seconds']:.1f}s, "
+        f"cpu use mean {usage['mean_cpu_utilization']:.0%} of {os.cpu_count()} cores, "
+        f"peak RSS per student {usage['peak_rss_mb']:.0f} MB (sum of peaks {usage['sum_peak_rss_mb']:.0f} MB, "
+        f"+{usage['peak_worker_rss_mb']:.0f} MB in extraction workers)"
+    )
+    print(f"traces and databases in {workdir}")
+    for name, messages in errors.items():
+        for message in messages[:3]:
+            print(f"  {name}: {message}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "steps": steps, "usage": usage, "errors": errors}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
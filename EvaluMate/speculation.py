@@ -0,0 +1,131 @@
+'''
+Speculative next questions for the chat-style viva.
+
+After an answer the viva needs two replies: feedback on the answer, then the
+next question (asked with the feedback in the history). Waiting for one and
+then the other doubles the turn latency. Here both calls go out together with
+asyncio.gather. The speculative question call sees the answer but not the
+feedback, and is told that feedback is given separately.
+
+The speculation is discarded when the feedback changes the direction of the
+conversation, e.g. it asks the student to try again or elaborate
+(`changes_direction`). The feedback then becomes the examiner's current
+question and the viva waits for the student's reply to it, with no further
+model call. Discarded speculations cost one extra call. When the speculation
+fails or comes back empty without the feedback asking anything, the next
+question is generated the normal way.
+
+    feedback, question = feedback_and_question(model, history)   # question is None if discarded
+
+    turn = SpeculativeTurn(model, history)                      # to stream the feedback
+    st.write_stream(timed_stream(turn.chunks(), timing))
+    feedback, question = turn.result()
+
+`history` ends with the student's answer. EVALUMATE_SPECULATE=0 turns the
+speculative mode off in the apps.
+'''
+import asyncio
+import contextvars
+import os
+import queue
+import re
+import threading
+
+from langchain_core.messages import SystemMessage
+
+from tracing import span
+
+SPECULATE = os.getenv("EVALUMATE_SPECULATE", "1") != "0"
+
+FEEDBACK_ONLY = "Evaluate my last answer and give feedback only. Do not ask the next question; it is asked separately."
+QUESTION_ONLY = ("Feedback on my last answer is given separately. Do not evaluate it. "
+                 "Reply only with your next viva question.")
+
+_FOLLOW_UP = re.compile(
+    r"\b(try again|think again|reconsider|elaborate|explain (?:that|this|it) (?:further|again)|"
+    r"can you (?:clarify|explain)|what do you mean)\b",
+    re.IGNORECASE,
+)
+
+
+def changes_direction(feedback):
+    """True if the feedback asks the student something, so the next question has to wait for their reply."""
+    return "?" in feedback or bool(_FOLLOW_UP.search(feedback))
+
+
+async def afeedback_and_question(model, history, on_chunk=None):
+    """(feedback text, next question or None), with both model calls running concurrently.
+
+    The feedback is streamed; `on_chunk(chunk)` sees each message chunk as it arrives.
+    """
+    async def feedback():
+        parts = []
+        async for chunk in model.astream(history + [SystemMessage(content=FEEDBACK_ONLY)]):
+            if on_chunk is not None:
+                on_chunk(chunk)
+            parts.append(chunk.content)
+        return "".join(parts)
+
+    async def question():
+        result = await model.ainvoke(history + [SystemMessage(content=QUESTION_ONLY)])
+        return result.content.strip()
+
+    with span("viva.turn", speculative=True) as trace:
+        feedback_text, speculated = await asyncio.gather(feedback(), question(), return_exceptions=True)
+        if isinstance(feedback_text, BaseException):
+            raise feedback_text
+        if isinstance(speculated, BaseException):
+            # Only an optimization: the next question is asked the normal way instead
+            trace.set(speculation=f"failed: {type(speculated).__name__}")
+            return feedback_text, None
+        if not speculated or changes_direction(feedback_text):
+            trace.set(speculation="discarded")
+            return feedback_text, None
+        trace.set(speculation="accepted")
+        return feedback_text, speculated
+
+
+def feedback_and_question(model, history):
+    return asyncio.run(afeedback_and_question(model, history))
+
+
+_DONE = object()
+
+
+class SpeculativeTurn:
+    """A speculative turn on a background thread, with the feedback available as a stream of chunks."""
+
+    def __init__(self, model, history):
+        self._chunks = queue.Queue()
+        self._result = None
+        self._error = None
+        history = list(history)
+        # Run in a copy of the caller's context so the turn's spans belong to the rerun that started it
+        context = contextvars.copy_context()
+        self._thread = threading.Thread(target=context.run, args=(self._run, model, history), daemon=True)
+        self._thread.start()
+
+    def _run(self, model, history):
+        try:
+            self._result = asyncio.run(afeedback_and_question(model, history, on_chunk=self._chunks.put))
+        except Exception as e:
+            self._error = e
+        finally:
+            self._chunks.put(_DONE)
+
+    def chunks(self):
+        """Feedback message chunks as they arrive (e.g. for timed_stream / st.write_stream)."""
+        while True:
+            chunk = self._chunks.get()
+            if chunk is _DONE:
+                break
+            yield chunk
+        if self._error is not None:
+            raise self._error
+
+    def result(self):
+        """(feedback text, next question or None) once both calls have finished."""
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._result
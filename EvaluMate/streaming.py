@@ -0,0 +1,53 @@
+'''
+Helpers for showing model replies token by token.
+
+`timed_stream` wraps `model.stream(...)` and yields only the text of each
+chunk, so it can go straight into `st.write_stream`. It also records the time
+to the first token separately from the total generation time. The first token
+is when the student stops looking at a blank screen, so it is reported on its
+own rather than folded into the total latency.
+'''
+import time
+
+
+class StreamTiming:
+    def __init__(self):
+        self.started = None
+        self.first_token = None
+        self.finished = None
+        self.chunks = 0
+
+    @property
+    def ttft(self):
+        """Seconds from the request to the first non-empty chunk (None if nothing arrived)."""
+        if self.started is None or self.first_token is None:
+            return None
+        return self.first_token - self.started
+
+    @property
+    def total(self):
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    def summary(self):
+        if self.ttft is None:
+            return f"no tokens received ({self.total or 0:.2f}s)"
+        return f"first token {self.ttft:.2f}s · total {self.total:.2f}s · {self.chunks} chunks"
+
+
+def timed_stream(chunks, timing):
+    """Yield the text of each streamed message chunk, filling in `timing` as it goes."""
+    # model.stream() is lazy: the request only goes out when the first chunk is pulled
+    timing.started = time.perf_counter()
+    try:
+        for chunk in chunks:
+            text = chunk.content if hasattr(chunk, "content") else str(chunk)
+            if not text:
+                continue
+            if timing.first_token is None:
+                timing.first_token = time.perf_counter()
+            timing.chunks += 1
+            yield text
+    finally:
+        timing.finished = time.perf_counter()
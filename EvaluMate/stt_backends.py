@@ -0,0 +1,153 @@
+'''
+Speech-to-text backends behind one interface.
+
+    recognizer = get_recognizer()             # EVALUMATE_STT=google (default) or vosk
+    text = recognizer.transcribe(recording)   # a finished audio_capture.Recording
+
+    recording, text = listen(recognizer, on_partial=print)
+
+`listen()` records until the student stops talking (see
+audio_capture.record_until_silence) and feeds each batch of frames to a
+recognizer session while recording is still going on. With Vosk, which runs
+locally on the CPU, the transcript grows during the answer (`on_partial`), and
+the final text is ready as soon as recording stops. Google needs the whole
+clip, so its session only transcribes once recording has ended.
+
+Whole clips go through audio_preprocessing.preprocess (16 kHz mono, level
+normalized, trimmed) before recognition. Streamed frames are fed as captured;
+Vosk resamples them itself.
+
+Vosk needs `pip install vosk` and a model directory
+(https://alphacephei.com/vosk/models) given by EVALUMATE_VOSK_MODEL.
+'''
+import json
+import os
+from functools import lru_cache
+
+import speech_recognition as sr
+
+from audio_capture import DEFAULT_SAMPLE_RATE, record_until_silence
+from audio_preprocessing import RECOGNIZER_SAMPLE_RATE, preprocess
+
+DEFAULT_BACKEND = os.getenv("EVALUMATE_STT", "google")
+VOSK_MODEL_PATH = os.getenv("EVALUMATE_VOSK_MODEL", os.path.join(os.path.dirname(os.path.abspath(__file__)), "vosk-model"))
+
+
+# ------------------ Google (network) ------------------
+class GoogleRecognizer:
+    name = "google"
+    streaming = False
+
+    def __init__(self):
+        self._recognizer = sr.Recognizer()
+
+    def transcribe(self, recording):
+        """Text of the recording, or "" if nothing could be understood."""
+        # 16 kHz mono at a steady level: a third of a 44.1 kHz upload, and what the service uses anyway
+        recording = preprocess(recording, RECOGNIZER_SAMPLE_RATE)
+        if recording.frames == 0:
+            return ""
+        try:
+            return self._recognizer.recognize_google(recording.audio_data())
+        except sr.UnknownValueError:
+            return ""
+
+    def session(self, sample_rate):
+        return _BufferedSession(self)
+
+
+class _BufferedSession:
+    """For recognizers that need the whole clip: nothing happens until finish()."""
+
+    def __init__(self, recognizer):
+        self._recognizer = recognizer
+
+    def feed(self, samples):
+        return ""
+
+    def finish(self, recording):
+        return self._recognizer.transcribe(recording)
+
+
+# ------------------ Vosk (local, streaming) ------------------
+@lru_cache(maxsize=None)
+def _vosk_model(path):
+    # Loading takes a few seconds and the model is read-only, so every session shares one
+    from vosk import Model, SetLogLevel
+
+    SetLogLevel(-1)
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"Vosk model not found at {path}; set EVALUMATE_VOSK_MODEL")
+    return Model(path)
+
+
+class VoskRecognizer:
+    name = "vosk"
+    streaming = True
+
+    def __init__(self, model_path=VOSK_MODEL_PATH):
+        self.model = _vosk_model(model_path)
+
+    def transcribe(self, recording):
+        recording = preprocess(recording, RECOGNIZER_SAMPLE_RATE)
+        session = self.session(recording.sample_rate)
+        session.feed(recording.samples)
+        return session.finish(recording)
+
+    def session(self, sample_rate):
+        return VoskSession(self.model, sample_rate)
+
+
+class VoskSession:
+    def __init__(self, model, sample_rate):
+        from vosk import KaldiRecognizer
+
+        self._recognizer = KaldiRecognizer(model, sample_rate)
+        self._segments = []
+
+    def feed(self, samples):
+        """Add mono int16 samples; returns the transcript so far (finished segments + current partial)."""
+        if self._recognizer.AcceptWaveform(samples.tobytes()):
+            self._add(json.loads(self._recognizer.Result()).get("text", ""))
+            partial = ""
+        else:
+            partial = json.loads(self._recognizer.PartialResult()).get("partial", "")
+        return " ".join(self._segments + ([partial] if partial else []))
+
+    def finish(self, recording=None):
+        """The final transcript; the audio was already fed, so this only flushes the last segment."""
+        self._add(json.loads(self._recognizer.FinalResult()).get("text", ""))
+        return " ".join(self._segments)
+
+    def _add(self, text):
+        if text:
+            self._segments.append(text)
+
+
+BACKENDS = {"google": GoogleRecognizer, "vosk": VoskRecognizer}
+
+
+def get_recognizer(name=None):
+    name = (name or DEFAULT_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"unknown speech recognizer {name!r}; choose from {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+def listen(recognizer, on_partial=None, **record_options):
+    """Record an answer while transcribing it; returns (trimmed recording, final text).
+
+    `record_options` go to record_until_silence (max_seconds, trailing_silence, sample_rate, ...).
+    """
+    session = recognizer.session(record_options.get("sample_rate", DEFAULT_SAMPLE_RATE))
+    last = ""
+
+    def on_audio(samples):
+        nonlocal last
+        text = session.feed(samples)
+        if on_partial is not None and text != last:
+            last = text
+            on_partial(text)
+
+    recording = record_until_silence(on_audio=on_audio, **record_options)
+    return recording, session.finish(recording)
@@ -0,0 +1,45 @@
+from qa_stream_parser import QALineStreamParser
+
+
+def parse(text, chunk=7):
+    parser = QALineStreamParser()
+    items = []
+    for i in range(0, len(text), chunk):
+        items.extend(parser.feed(text[i:i + chunk]))
+    items.extend(parser.close())
+    return parser, items
+
+
+def test_levels_and_items():
+    parser, items = parse("Easy:\nQ1: What is a tensor?\nA1: An array.\n\n**Difficult Questions**\nQ1: Why?\nA1: Because.")
+    assert [(qa["level"], qa["question"], qa["answer"]) for qa in items] == [
+        ("Easy", "What is a tensor?", "An array."),
+        ("Difficult", "Why?", "Because."),
+    ]
+    assert parser.skipped == []
+
+
+def test_wrapped_answer_is_not_a_level_header():
+    text = (
+        "Moderate:\n"
+        "Q1: What does the learning rate control?\n"
+        "A1: The step size of each update, a setting\n"
+        "that is hard to tune well.\n"
+        "Easy:\n"
+        "Q1: What is a loss function?\n"
+        "A1: A measure of error.\n"
+        "Q2: What is an epoch?\n"
+        "A2: One pass over the data, which is easy\n"
+        "to mistake for a batch.\n"
+        "Q3: Name an optimizer.\n"
+        "A3: Adam.\n"
+    )
+    parser, items = parse(text)
+    assert [qa["level"] for qa in items] == ["Moderate", "Easy", "Easy", "Easy"]
+    assert parser.skipped == ["that is hard to tune well.", "to mistake for a batch."]
+
+
+def test_wrapped_question_is_joined():
+    _, items = parse("Hard:\nQ1: Why is a hard margin\nSVM sensitive to outliers?\nA1: It allows no violations.")
+    assert items[0]["level"] == "Difficult"
+    assert items[0]["question"] == "Why is a hard margin SVM sensitive to outliers?"
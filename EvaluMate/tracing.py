@@ -0,0 +1,228 @@
+'''
+Lightweight latency tracing for the EvaluMate apps.
+
+    with span("pdf.extract", pages=120) as s:
+        ...
+        s.set(workers=4)
+
+Recent spans are kept in memory for the in-app `debug_panel()`. Writing them
+to disk is opt-in: with EVALUMATE_TRACE_FILE set, each finished span is also
+one JSON line in that file, with its name, start time, duration, attributes
+and the ids of its trace, parent and session. Once the file passes
+EVALUMATE_TRACE_MAX_MB it is renamed to "<file>.1" (replacing the previous
+one) and a new file is started, so at most twice that is kept on disk.
+
+Spans nest through a context variable, so work done inside a span (in the same
+thread or asyncio task) becomes its child. Every Streamlit script run gets a
+"rerun" span from begin_rerun()/end_rerun(). If a run ends early through
+st.rerun() or st.stop(), its span is closed at the session's next run and
+marked interrupted, with its end set to its last traced activity.
+
+    EVALUMATE_TRACE_FILE=path   JSONL output (off by default)
+    EVALUMATE_TRACE_MAX_MB=50   rotate the file at this size
+    EVALUMATE_DEBUG=1           show the debug panel (or open the app with ?debug=1)
+'''
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+TRACE_FILE = os.getenv("EVALUMATE_TRACE_FILE", "")
+TRACE_MAX_BYTES = int(float(os.getenv("EVALUMATE_TRACE_MAX_MB", "50")) * 1024 * 1024)
+RECENT_SPANS = 2000
+
+_current = contextvars.ContextVar("evalumate_span", default=None)
+_recent = deque(maxlen=RECENT_SPANS)
+_open_reruns = {}  # session -> its rerun Span while the script is running
+_lock = threading.Lock()
+_file = None
+
+
+def _new_id():
+    return uuid.uuid4().hex[:16]
+
+
+class Span:
+    def __init__(self, name, attrs, parent, session=None):
+        self.name = name
+        self.attrs = attrs
+        self.span_id = _new_id()
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else _new_id()
+        self.session = parent.session if parent else session
+        self.parent = parent
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.last_activity = self._start
+        self.duration = None
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "start": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "session": self.session,
+            "thread": threading.current_thread().name,
+            "error": self.error,
+            "attrs": self.attrs,
+        }
+
+
+def _write(record):
+    global _file
+    with _lock:
+        _recent.append(record)
+        if not TRACE_FILE:
+            return
+        if _file is None:
+            _file = open(TRACE_FILE, "a", encoding="utf-8")
+        _file.write(json.dumps(record, default=str) + "\n")
+        _file.flush()
+        if _file.tell() >= TRACE_MAX_BYTES:
+            _file.close()
+            os.replace(TRACE_FILE, TRACE_FILE + ".1")
+            _file = None
+
+
+def _finish(span, end=None):
+    end = time.perf_counter() if end is None else end
+    span.duration = end - span._start
+    if span.parent is not None:
+        span.parent.last_activity = max(span.parent.last_activity, end)
+    _write(span.to_dict())
+
+
+def current_span():
+    return _current.get()
+
+
+def start_span(name, session=None, **attrs):
+    """Start a span as a child of the current one; finish it with end_span()."""
+    span = Span(name, attrs, _current.get(), session)
+    span._token = _current.set(span)
+    return span
+
+
+def end_span(span, **attrs):
+    span.set(**attrs)
+    try:
+        _current.reset(span._token)
+    except ValueError:
+        # Ended from another context than it was started in
+        _current.set(span.parent)
+    _finish(span)
+
+
+@contextmanager
+def span(name, **attrs):
+    s = start_span(name, **attrs)
+    try:
+        yield s
+    except Exception as e:
+        # st.rerun()/st.stop() unwind as BaseException and are not errors
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        end_span(s)
+
+
+def record_span(name, start, end, parent=None, error=None, **attrs):
+    """Record a span whose start and end (perf_counter values) were measured elsewhere, e.g. in a callback."""
+    s = Span(name, attrs, parent)
+    s._start = start
+    s.started_at = time.time() - (time.perf_counter() - start)
+    s.error = error
+    _finish(s, end)
+
+
+# ------------------ Streamlit reruns ------------------
+def begin_rerun(session, **attrs):
+    """Call at the top of the app script; everything traced during this run becomes its child."""
+    with _lock:
+        previous = _open_reruns.pop(session, None)
+    if previous is not None:
+        previous.set(interrupted=True)
+        _finish(previous, end=previous.last_activity)
+    span = Span("rerun", attrs, None, session)
+    _current.set(span)
+    with _lock:
+        _open_reruns[session] = span
+    return span
+
+
+def end_rerun(session, **attrs):
+    """Call at the bottom of the app script."""
+    with _lock:
+        span = _open_reruns.pop(session, None)
+    _current.set(None)
+    if span is not None:
+        span.set(**attrs)
+        _finish(span)
+
+
+def recent_spans(session=None):
+    with _lock:
+        spans = list(_recent)
+    if session is not None:
+        spans = [s for s in spans if s["session"] == session]
+    return spans
+
+
+def session_id():
+    """A stable id for the current Streamlit session, kept in its session state."""
+    import streamlit as st
+
+    if "trace_session" not in st.session_state:
+        st.session_state.trace_session = _new_id()
+    return st.session_state.trace_session
+
+
+def debug_enabled():
+    import streamlit as st
+
+    return bool(os.getenv("EVALUMATE_DEBUG")) or st.query_params.get("debug") == "1"
+
+
+def debug_panel(session=None, limit=100):
+    """Show this session's recent spans, and the time per stage, in a Streamlit expander."""
+    import streamlit as st
+
+    spans = recent_spans(session)[-limit:]
+    with st.expander(f"🐞 Trace ({len(spans)} recent spans)"):
+        totals = {}
+        for s in spans:
+            count, total = totals.get(s["name"], (0, 0.0))
+            totals[s["name"]] = (count + 1, total + s["duration_ms"])
+        st.markdown("**Time per stage**")
+        st.dataframe(
+            [
+                {"stage": name, "count": count, "total ms": round(total, 1), "mean ms": round(total / count, 1)}
+                for name, (count, total) in sorted(totals.items(), key=lambda item: -item[1][1])
+            ],
+            use_container_width=True,
+        )
+        st.markdown("**Recent spans**")
+        st.dataframe(
+            [
+                {
+                    "time": time.strftime("%H:%M:%S", time.localtime(s["start"])),
+                    "span": s["name"],
+                    "ms": round(s["duration_ms"], 1),
+                    "error": s["error"] or "",
+                    "attrs": json.dumps(s["attrs"], default=str),
+                }
+                for s in reversed(spans)
+            ],
+            use_container_width=True,
+        )
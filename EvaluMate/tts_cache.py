@@ -0,0 +1,282 @@
+'''
+Process-wide cache of synthesized question audio.
+
+Audio is keyed by (text, voice, rate) and kept as bytes in memory, so playing
+a question through `st.audio` needs no synthesis and no temp file. `prefetch()`
+synthesizes whole question banks on a small thread pool as soon as the
+questions exist. By the time a student clicks "Read Question Aloud", the audio
+is usually ready. A request for audio that is still being synthesized waits
+for that job instead of starting another. Entries are evicted least recently
+used first once the cache is over its memory budget.
+
+`stream()` splits long text into sentences and synthesizes them all at once
+on the pool, yielding each sentence's audio in order as soon as it is ready.
+Playback of the first sentence can start while later ones are still being
+rendered (see audio_player.play_segments). Sentences are cached on their own,
+and `join_speech()` glues them back into one clip for replay. The
+"tts.stream" span records the time to the first audio segment (ttfa_ms).
+
+    EVALUMATE_TTS=gtts|pyttsx3   synthesizer (gtts by default; pyttsx3 works offline)
+    EVALUMATE_TTS_CACHE_MB=64    memory budget
+'''
+import hashlib
+import io
+import json
+import os
+import queue
+import re
+import sys
+import tempfile
+import threading
+import time
+import wave
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from tracing import current_span, record_span, span
+
+DEFAULT_MAX_BYTES = int(os.getenv("EVALUMATE_TTS_CACHE_MB", "64")) * 1024 * 1024
+DEFAULT_WORKERS = 4
+# Shorter sentences are merged into the one before; each gTTS request has a fixed round-trip cost
+MIN_SENTENCE_CHARS = 25
+
+Speech = namedtuple("Speech", ["data", "format"])
+
+
+# ------------------ Synthesizers ------------------
+def gtts_synthesize(text, voice="en", rate=1.0):
+    """MP3 via Google TTS; `voice` is a language code, and rates below 1 use gTTS's slow mode."""
+    from gtts import gTTS
+
+    buffer = io.BytesIO()
+    gTTS(text=text, lang=voice or "en", slow=rate < 1.0).write_to_fp(buffer)
+    return Speech(buffer.getvalue(), "audio/mp3")
+
+
+class _Pyttsx3Renderer:
+    """One pyttsx3 engine on its own thread, rendering jobs to WAV one after another.
+
+    pyttsx3 engines must be driven from the thread that created them, and on
+    Windows that thread needs COM initialized for SAPI5 (as in tts_worker.py).
+    The cache's pool threads hand their jobs over here instead of creating an
+    engine each.
+    """
+
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _run(self):
+        engine = default_rate = default_voice = None
+        while True:
+            text, voice, rate, future = self._jobs.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            fd, path = tempfile.mkstemp(suffix=".wav")
+            os.close(fd)
+            try:
+                if engine is None:
+                    if sys.platform == "win32":
+                        import comtypes
+
+                        comtypes.CoInitialize()
+                    import pyttsx3
+
+                    engine = pyttsx3.init()
+                    default_rate = engine.getProperty("rate")
+                    default_voice = engine.getProperty("voice")
+                engine.setProperty("rate", int(default_rate * rate))
+                engine.setProperty("voice", voice or default_voice)
+                engine.save_to_file(text, path)
+                engine.runAndWait()
+                with open(path, "rb") as f:
+                    future.set_result(Speech(f.read(), "audio/wav"))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                os.remove(path)
+
+    def render(self, text, voice=None, rate=1.0):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="tts-pyttsx3", daemon=True)
+                self._thread.start()
+        future = Future()
+        self._jobs.put((text, voice, rate, future))
+        return future.result()
+
+
+_pyttsx3_renderer = _Pyttsx3Renderer()
+
+
+def pyttsx3_synthesize(text, voice=None, rate=1.0):
+    """WAV via the local pyttsx3 engine; `voice` is an engine voice id, `rate` scales its default speed."""
+    return _pyttsx3_renderer.render(text, voice, rate)
+
+
+SYNTHESIZERS = {"gtts": gtts_synthesize, "pyttsx3": pyttsx3_synthesize}
+
+
+def get_synthesizer(name=None):
+    """The synthesize function for `name` (default EVALUMATE_TTS, else gtts)."""
+    name = (name or os.getenv("EVALUMATE_TTS") or "gtts").lower()
+    if name not in SYNTHESIZERS:
+        raise ValueError(f"unknown speech synthesizer {name!r}; choose from {', '.join(SYNTHESIZERS)}")
+    return SYNTHESIZERS[name]
+
+
+# ------------------ Sentences ------------------
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_sentences(text, min_chars=MIN_SENTENCE_CHARS):
+    """Sentences of `text`, with whitespace collapsed and short ones appended to the sentence before."""
+    sentences = []
+    for part in _SENTENCE_END.split(" ".join(text.split())):
+        if not part:
+            continue
+        if sentences and len(part) < min_chars:
+            sentences[-1] = f"{sentences[-1]} {part}"
+        else:
+            sentences.append(part)
+    return sentences
+
+
+def join_speech(segments):
+    """One Speech from consecutive segments of the same format (MP3 frames concatenate; WAV is re-framed)."""
+    segments = list(segments)
+    if len(segments) == 1:
+        return segments[0]
+    audio_format = segments[0].format
+    if audio_format != "audio/wav":
+        return Speech(b"".join(s.data for s in segments), audio_format)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        for i, segment in enumerate(segments):
+            with wave.open(io.BytesIO(segment.data), "rb") as part:
+                if i == 0:
+                    out.setparams(part.getparams())
+                out.writeframes(part.readframes(part.getnframes()))
+    return Speech(buffer.getvalue(), audio_format)
+
+
+# ------------------ Cache ------------------
+class TTSCache:
+    def __init__(self, synthesize=None, max_bytes=DEFAULT_MAX_BYTES, workers=DEFAULT_WORKERS):
+        self.synthesize = synthesize or get_synthesizer()
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> Speech
+        self._pending = {}  # key -> Future of a synthesis in progress
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts")
+
+    @staticmethod
+    def key(text, voice=None, rate=1.0):
+        raw = json.dumps([" ".join(text.split()), voice, rate])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, text, voice=None, rate=1.0):
+        """Cached Speech, or None (does not synthesize)."""
+        key = self.key(text, voice, rate)
+        with self._lock:
+            speech = self._entries.get(key)
+            if speech is not None:
+                self._entries.move_to_end(key)
+            return speech
+
+    def _put(self, key, speech):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old.data)
+            self._entries[key] = speech
+            self.current_bytes += len(speech.data)
+            # Always keep the newest entry, even if it alone is over budget
+            while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted.data)
+
+    def _run(self, key, text, voice, rate):
+        try:
+            with span("tts.synthesize", chars=len(text)) as trace:
+                speech = self.synthesize(text, voice, rate)
+                trace.set(bytes=len(speech.data))
+            self._put(key, speech)
+            return speech
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _submit(self, text, voice, rate):
+        """(cached Speech, None) or (None, Future of the synthesis); call with the lock held."""
+        key = self.key(text, voice, rate)
+        speech = self._entries.get(key)
+        if speech is not None:
+            self._entries.move_to_end(key)
+            return speech, None
+        future = self._pending.get(key)
+        if future is None:
+            future = self._pool.submit(self._run, key, text, voice, rate)
+            self._pending[key] = future
+        return None, future
+
+    def prefetch(self, texts, voice=None, rate=1.0):
+        """Start synthesizing every text that is not cached or already in progress."""
+        with self._lock:
+            for text in texts:
+                if text and text.strip():
+                    self._submit(text, voice, rate)
+
+    def speech(self, text, voice=None, rate=1.0, timeout=None):
+        """Speech for `text`: from the cache, from a synthesis already running, or synthesized now."""
+        with self._lock:
+            speech, future = self._submit(text, voice, rate)
+            if speech is not None:
+                self.hits += 1
+                return speech
+            self.misses += 1
+        return future.result(timeout)
+
+    def stream(self, text, voice=None, rate=1.0, timeout=None):
+        """Yield a Speech per sentence of `text`, in order, each as soon as it has been synthesized."""
+        sentences = split_sentences(text)
+        parent = current_span()
+        started = time.perf_counter()
+        with self._lock:
+            jobs = [self._submit(sentence, voice, rate) for sentence in sentences]
+            cached = sum(1 for speech, _ in jobs if speech is not None)
+            self.hits += cached
+            self.misses += len(jobs) - cached
+        first = None
+        try:
+            for speech, future in jobs:
+                if speech is None:
+                    speech = future.result(timeout)
+                if first is None:
+                    first = time.perf_counter()
+                yield speech
+        finally:
+            # Recorded afterwards rather than as an open span, so the caller's own spans
+            # between segments do not nest under this one
+            attrs = {"chars": len(text), "segments": len(jobs), "cached": cached}
+            if first is not None:
+                attrs["ttfa_ms"] = round((first - started) * 1000, 3)
+            record_span("tts.stream", started, time.perf_counter(), parent=parent, **attrs)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "pending": len(self._pending),
+                "bytes": self.current_bytes,
+            }
+
+
+# Shared by all sessions in this Streamlit process
+tts_cache = TTSCache()
@@ -0,0 +1,138 @@
+'''
+Long-lived pyttsx3 speaker that runs off the caller's thread.
+
+pyttsx3 engines are slow to create and must be driven from the thread that
+created them. The worker owns a single engine on its own thread and speaks
+queued jobs one after another. `speak()` returns a Future at once, so the
+Streamlit script (or a CLI prompt) keeps going while the text is read out.
+Call `.result()` on the future to wait for the speech. Long text is queued on
+the engine sentence by sentence, so speaking starts after the first sentence
+is rendered rather than the whole text; the "tts.pyttsx3" span records the
+time to first audio (ttfa_ms).
+
+Cancelling a future that has not started drops it from the queue.
+`interrupt()` also stops the utterance in progress at the next word, and
+`cancel_all()` does both, e.g. when a new question replaces the one being
+read.
+'''
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+from tracing import span
+from tts_cache import split_sentences
+
+_STOP = object()
+
+
+class TTSWorker:
+    def __init__(self, configure=None):
+        """`configure(engine)` is called once on the worker thread, e.g. to set rate, volume and voice."""
+        self._configure = configure
+        self._jobs = queue.Queue()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._interrupt = threading.Event()
+        self._ready = Future()
+        self._first_audio = None
+        self._thread = threading.Thread(target=self._run, name="tts-worker", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            if sys.platform == "win32":
+                # The SAPI5 driver talks COM, which has to be initialized on every thread that uses it
+                import comtypes
+
+                comtypes.CoInitialize()
+            import pyttsx3
+
+            engine = pyttsx3.init()
+            if self._configure is not None:
+                self._configure(engine)
+            engine.connect("started-word", self._on_word)
+            engine.connect("started-utterance", self._on_utterance)
+            self._engine = engine
+            self._ready.set_result(True)
+        except Exception as e:
+            self._ready.set_exception(e)
+            return
+
+        while True:
+            job = self._jobs.get()
+            if job is _STOP:
+                return
+            text, future = job
+            with self._lock:
+                if future in self._pending:
+                    self._pending.remove(future)
+            if not future.set_running_or_notify_cancel():
+                continue
+            self._interrupt.clear()
+            self._first_audio = None
+            try:
+                with span("tts.pyttsx3", chars=len(text)) as trace:
+                    started = time.perf_counter()
+                    sentences = split_sentences(text)
+                    for sentence in sentences:
+                        engine.say(sentence)
+                    engine.runAndWait()
+                    trace.set(segments=len(sentences), interrupted=self._interrupt.is_set())
+                    if self._first_audio is not None:
+                        trace.set(ttfa_ms=round((self._first_audio - started) * 1000, 3))
+                future.set_result(not self._interrupt.is_set())
+            except Exception as e:
+                future.set_exception(e)
+
+    def _on_utterance(self, name):
+        if self._first_audio is None:
+            self._first_audio = time.perf_counter()
+
+    def _on_word(self, name, location, length):
+        # Runs on the worker thread inside runAndWait, where stopping the engine is safe
+        if self._interrupt.is_set():
+            self._engine.stop()
+
+    def speak(self, text):
+        """Queue `text`; the Future resolves to True once spoken, or False if interrupted."""
+        future = Future()
+        with self._lock:
+            self._pending.append(future)
+        self._jobs.put((text, future))
+        return future
+
+    def interrupt(self):
+        """Stop the utterance being spoken right now (queued jobs still run)."""
+        self._interrupt.set()
+
+    def cancel_all(self):
+        """Drop every queued job and interrupt the one being spoken."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for future in pending:
+            future.cancel()
+        self.interrupt()
+
+    def wait_ready(self, timeout=None):
+        """Block until the engine is initialized; raises if pyttsx3 could not start."""
+        return self._ready.result(timeout)
+
+    def close(self):
+        self.cancel_all()
+        self._jobs.put(_STOP)
+        self._thread.join()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_tts_worker(configure=None):
+    """The process-wide worker (created on first use; `configure` only applies then)."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = TTSWorker(configure)
+        return _worker